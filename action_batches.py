@@ -0,0 +1,144 @@
+import time
+
+import meraki
+
+from metrics import metrics
+
+# Submitting configuration changes as Dashboard action batches and tracking them until they finish.
+
+MAX_BATCH_ACTIONS = 100     # Actions allowed in one asynchronous action batch
+MAX_RUNNING_BATCHES = 5     # Asynchronous batches the Dashboard runs at once per organization
+POLL_INTERVAL = 1           # Seconds before the first status check of a batch
+MAX_POLL_INTERVAL = 15      # Longest wait between status checks
+BATCH_TIMEOUT = 600         # Seconds to track a batch before reporting it as still pending
+
+
+def submit_batch(dashboard, limiter, org_id, actions: list):
+    return limiter.call(
+        dashboard.organizations.createOrganizationActionBatch,
+        org_id,
+        actions,
+        confirmed=True,
+        synchronous=False
+        )
+
+
+# Keeps up to max_running asynchronous batches in flight while the next one is being filled.
+# Actions are added one at a time with a label (e.g. the network they change); a batch is
+# submitted as soon as it is full. Outstanding batches are checked with one listing of the
+# organization's pending batches, backing off while none of them finish.
+# on_submit(batch, labels) is called for every submitted batch, e.g. to journal it.
+# before_submit(labels) is called right before a batch is sent, so its actions can be planned
+# with what the batches that finished so far showed; the labels may share objects with the
+# actions. on_finish(batch, labels) is called for every result as soon as it is known.
+class BatchScheduler:
+    def __init__(self, dashboard, limiter, org_id, max_running: int = MAX_RUNNING_BATCHES,
+                 batch_size: int = MAX_BATCH_ACTIONS, timeout: float = BATCH_TIMEOUT, on_submit=None,
+                 before_submit=None, on_finish=None):
+        self.dashboard = dashboard
+        self.limiter = limiter
+        self.org_id = org_id
+        self.max_running = max_running
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.on_submit = on_submit
+        self.before_submit = before_submit
+        self.on_finish = on_finish
+        self.actions = []
+        self.labels = []
+        self.running = {}           # batch id -> (labels, submitted at)
+        self.results = []           # (batch or None, labels)
+        self.interval = POLL_INTERVAL
+
+    def add(self, action: dict, label):
+        self.actions.append(action)
+        self.labels.append(label)
+        if len(self.actions) >= self.batch_size:
+            self.flush()
+
+        return None
+
+    # Submit the actions collected so far, waiting for a free slot first.
+    def flush(self):
+        if not self.actions:
+            return None
+        while len(self.running) >= self.max_running:
+            self.wait()
+
+        actions, labels = self.actions, self.labels
+        self.actions, self.labels = [], []
+        if self.before_submit is not None:
+            self.before_submit(labels)
+        try:
+            batch = submit_batch(self.dashboard, self.limiter, self.org_id, actions)
+        except meraki.APIError as e:
+            print(f"Failed to send action batch: {e}")
+            self.finished(None, labels)
+            return None
+
+        print(f"Action batch {batch['id']} sent with {len(actions)} actions..")
+        self.running[batch['id']] = (labels, time.monotonic())
+        if self.on_submit is not None:
+            self.on_submit(batch, labels)
+
+        return None
+
+    # Track a batch that was submitted earlier, e.g. by an interrupted run.
+    def track(self, batch_id: str, labels: list):
+        self.running[batch_id] = (list(labels), time.monotonic())
+
+        return None
+
+    # Sleep for the current poll interval and collect the batches that finished meanwhile.
+    def wait(self):
+        metrics.pause(self.interval, 'batch_poll')
+        if self.poll():
+            self.interval = POLL_INTERVAL
+        else:
+            self.interval = min(MAX_POLL_INTERVAL, self.interval * 2)
+
+        return None
+
+    # Check every outstanding batch with one listing. A batch missing from the pending listing is
+    # only done once its own status says completed or failed, as the listing can lag behind a
+    # batch that was just submitted. Batches are given up on after the timeout. Returns how many
+    # batches finished.
+    def poll(self):
+        pending = self.limiter.call(self.dashboard.organizations.getOrganizationActionBatches,
+                                    self.org_id, status='pending')
+        pending_ids = {batch['id'] for batch in pending}
+        finished = 0
+
+        for batch_id, (labels, submitted) in list(self.running.items()):
+            timed_out = time.monotonic() - submitted >= self.timeout
+            if batch_id in pending_ids:
+                if not timed_out:
+                    continue
+                batch = {'id': batch_id, 'status': {'completed': False, 'failed': False, 'errors': []}}
+            else:
+                batch = self.limiter.call(self.dashboard.organizations.getOrganizationActionBatch,
+                                          self.org_id, batch_id)
+                status = batch['status']
+                if not (status.get('completed') or status.get('failed') or timed_out):
+                    continue
+            del self.running[batch_id]
+            self.finished(batch, labels)
+            finished += 1
+
+        return finished
+
+    def finished(self, batch, labels: list):
+        self.results.append((batch, labels))
+        if self.on_finish is not None:
+            self.on_finish(batch, labels)
+
+        return None
+
+    # Submit what is left, wait for every batch and return the (batch, labels) results.
+    # A batch is None if it could not be submitted, and neither completed nor failed on timeout.
+    def finish(self):
+        self.flush()
+        while self.running:
+            self.wait()
+
+        return list(self.results)
@@ -0,0 +1,229 @@
+import contextlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rate_limiter import RateLimiter
+from export_writers import output_name
+from metrics import metrics
+
+# Runs the scripts without prompts for many organizations at once.
+# Every organization gets its own worker process and its own rate limiter, so one busy
+# organization does not slow down the others; the jobs of one organization run one after
+# another so they share its rate budget. The output of each job goes to a log file and a
+# summary of all jobs is written to summary.json in the output directory, next to the
+# run metrics of every job (<job>_metrics.json and .prom).
+#
+# Usage:  python batch_runner.py jobs.json [--resume]
+#
+# {
+#   "workers": 4,
+#   "output_dir": "batch_output",
+#   "jobs": [
+#     {"org_id": "123456", "job": "export", "search": ["helsinki"], "filter": ["test"], "tags": [],
+#      "options": {"OUTPUT_FORMAT": "parquet"}},
+#     {"org_id": "123456", "job": "syslog", "tags": ["store"]},
+#     {"org_id": "654321", "job": "ssid", "api_key_env": "CUSTOMER_B_API_KEY",
+#      "ssid": {"name": "Office", "radius_host": "10.0.0.5", "radius_secret_env": "RADIUS_SECRET"}}
+#   ]
+# }
+#
+# API keys and RADIUS secrets are read from the environment variables named in the job,
+# never from the file. "options" overrides the settings at the top of the script for that job.
+# With --resume every job continues from the journal its interrupted run left behind; exports
+# that keep no journal (parquet, arrow, compressed or combined) start from the beginning.
+
+DEFAULT_WORKERS = 4
+DEFAULT_OUTPUT_DIR = 'batch_output'
+DEFAULT_API_KEY_ENV = 'MERAKI_DASHBOARD_API_KEY'
+
+JOB_MODULES = {
+    'export': 'devices_and_clients_to_csv',
+    'syslog': 'updateNetworkSyslog',
+    'ssid': 'update_appliance_ssid_RADIUS'
+    }
+
+
+def load_jobs(path: str):
+    with open(path, 'r', encoding='utf-8') as jobs_file:
+        config = json.load(jobs_file)
+
+    for number, job in enumerate(config.get('jobs', [])):
+        if 'org_id' not in job:
+            raise ValueError(f"Job {number} has no org_id.")
+        if job.get('job') not in JOB_MODULES:
+            raise ValueError(f"Job {number} has an unknown job type: {job.get('job')}")
+        if job['job'] == 'ssid' and 'ssid' not in job:
+            raise ValueError(f"Job {number} is an ssid job without ssid settings.")
+        job['number'] = number
+
+    return dict(config)
+
+
+def env_value(name: str):
+    value = os.environ.get(name)
+    if not value:
+        raise ValueError(f"Environment variable {name} is not set.")
+
+    return value
+
+
+def keywords(job: dict, key: str):
+    return [term.strip().lower() for term in job.get(key, []) if term.strip()]
+
+
+# Run the job with the script's own functions and return its job-specific counts.
+def run_script(module, job: dict):
+    networks = module.filterNetworks(module.org_id, keywords(job, 'search'), keywords(job, 'filter'),
+                                     keywords(job, 'tags'))
+    print(f"{len(networks)} networks selected.")
+    counts = {'networks': len(networks)}
+
+    if job['job'] == 'export':
+        module.exportData(networks)
+        base_names = [module.DEVICES_FILE, module.CLIENTS_FILE] + ([module.COMBINED_FILE] if module.COMBINED_FILE else [])
+        counts['files'] = [output_name(base_name, module.OUTPUT_FORMAT, module.COMPRESSION) for base_name in base_names]
+    elif job['job'] == 'syslog':
+        counts['planned' if module.DRY_RUN else 'updated'] = len(module.applySyslogServers(networks))
+    else:
+        ssid = job['ssid']
+        SSID_info = module.buildSSIDInfo(ssid['name'], ssid['radius_host'], env_value(ssid['radius_secret_env']))
+        if module.DRY_RUN:
+            counts['planned'] = len(module.previewSSIDS(networks, SSID_info))
+            return dict(counts)
+        results = module.updateSSIDS(networks, SSID_info)
+        for batch, labels in results:
+            if batch is None or batch['status'].get('failed'):
+                status = 'failed'
+            elif batch['status'].get('completed'):
+                status = 'completed'
+            else:
+                status = 'pending'
+            counts[status] = counts.get(status, 0) + len(labels)
+
+    return dict(counts)
+
+
+def run_job(job: dict, limiter: RateLimiter, output_dir: str):
+    module = importlib.import_module(JOB_MODULES[job['job']])
+    name = f"{job['org_id']}_{job['job']}_{job['number']}"
+    log_path = os.path.join(output_dir, f"{name}.log")
+    options = dict(job.get('options', {}))
+    if job['job'] == 'export':
+        options.setdefault('DEVICES_FILE', os.path.join(output_dir, f"{name}_devices"))
+        options.setdefault('CLIENTS_FILE', os.path.join(output_dir, f"{name}_clients"))
+
+    result = {'org_id': job['org_id'], 'job': job['job'], 'status': 'ok', 'log': log_path}
+    saved = {}
+    metrics.reset()
+    started = time.monotonic()
+    with open(log_path, 'w', encoding='utf-8') as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            for option, value in options.items():
+                if not option.isupper() or not hasattr(module, option):
+                    raise ValueError(f"Unknown option for {job['job']} jobs: {option}")
+                saved[option] = getattr(module, option)
+                setattr(module, option, value)
+            module.org_id = job['org_id']
+            module.limiter = limiter
+            module.connect(env_value(job.get('api_key_env', DEFAULT_API_KEY_ENV)))
+            result.update(run_script(module, job))
+        except Exception as e:
+            print(f"Error: {e}")
+            result['status'] = 'error'
+            result['error'] = str(e)
+        finally:
+            for option, value in saved.items():
+                setattr(module, option, value)
+    result['elapsed'] = round(time.monotonic() - started, 1)
+    metrics.write(os.path.join(output_dir, f"{name}_metrics"), {'org': job['org_id'], 'job': job['job']})
+    run = metrics.snapshot()
+    result['calls'] = run['calls']
+    result['rate_limited'] = run['rate_limited']
+
+    return dict(result)
+
+
+# Worker process entry point: run the jobs of one organization in order with a shared rate limiter.
+def run_org(org_jobs: list, output_dir: str):
+    limiter = RateLimiter()
+
+    return [run_job(job, limiter, output_dir) for job in org_jobs]
+
+
+def run_jobs(config: dict):
+    output_dir = config.get('output_dir', DEFAULT_OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    jobsByOrg = {}
+    for job in config.get('jobs', []):
+        jobsByOrg.setdefault(str(job['org_id']), []).append(job)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=config.get('workers', DEFAULT_WORKERS)) as executor:
+        futures = {executor.submit(run_org, org_jobs, output_dir): org_jobs for org_jobs in jobsByOrg.values()}
+        for future in as_completed(futures):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                for job in futures[future]:
+                    results.append({'org_id': job['org_id'], 'job': job['job'], 'status': 'error', 'error': str(e)})
+
+    return list(results)
+
+
+def write_summary(output_dir: str, results: list):
+    summary = {
+        'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'jobs': len(results),
+        'failed': sum(1 for result in results if result['status'] != 'ok'),
+        'results': results
+        }
+    path = os.path.join(output_dir, 'summary.json')
+    with open(path, 'w', encoding='utf-8') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    return path
+
+
+def print_summary(results: list):
+    print(f"{'Organization':<20} {'Job':<8} {'Status':<7} {'Networks':>8} {'Seconds':>8}  Details")
+    for result in results:
+        details = {key: value for key, value in result.items()
+                   if key not in ('org_id', 'job', 'status', 'networks', 'elapsed', 'log')}
+        print(f"{str(result['org_id']):<20} {result['job']:<8} {result['status']:<7} "
+              f"{result.get('networks', '-'):>8} {result.get('elapsed', '-'):>8}  "
+              f"{', '.join(f'{key}: {value}' for key, value in details.items())}")
+
+    return None
+
+
+def main():
+    arguments = [argument for argument in sys.argv[1:] if argument != '--resume']
+    if len(arguments) != 1:
+        print("Usage: python batch_runner.py jobs.json [--resume]")
+        sys.exit(1)
+
+    try:
+        config = load_jobs(arguments[0])
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if '--resume' in sys.argv[1:]:
+        for job in config.get('jobs', []):
+            job.setdefault('options', {})['RESUME'] = True
+
+    results = run_jobs(config)
+    results.sort(key=lambda result: (str(result['org_id']), result['job']))
+    print_summary(results)
+    path = write_summary(config.get('output_dir', DEFAULT_OUTPUT_DIR), results)
+    print(f"Summary written to {path}")
+    if any(result['status'] != 'ok' for result in results):
+        sys.exit(1)
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
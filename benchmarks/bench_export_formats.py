@@ -0,0 +1,129 @@
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from export_schema import CLIENT_COLUMNS, headers
+from export_writers import EXTENSIONS, open_writer, pyarrow
+
+# Benchmark of the client export formats: the semicolon CSV written by the old per-network
+# Datatocsv appends against the Parquet and Arrow writers. Reports write time, file size and
+# the time to load the file back into memory.
+#
+# Run from the repository root:  python benchmarks/bench_export_formats.py [rows]
+
+NETWORKS = 200
+OS_NAMES = ['iOS', 'Android', 'Windows 10', 'Windows 11', 'macOS', 'Linux', 'None']
+SSIDS = ['Office', 'Guest', 'IoT', 'Staff', 'None']
+
+
+# Client rows grouped per network, as the export code produces them.
+def synthetic_clients(rows: int, seed: int = 1):
+    rng = random.Random(seed)
+    now = 1700000000
+    networks = []
+    per_network = rows // NETWORKS
+    for n in range(NETWORKS):
+        network_name = f"Site {n:04d}"
+        clients = []
+        for i in range(per_network):
+            first_seen = now - rng.randint(0, 2678400)
+            clients.append({
+                'network': network_name,
+                'id': f"k{n:04d}{i:06d}",
+                'description': rng.choice([f"host-{i}", 'None']),
+                'mac': ':'.join(f"{rng.randint(0, 255):02x}" for _ in range(6)),
+                'ip': f"10.{n % 256}.{i // 256 % 256}.{i % 256}",
+                'ip6': 'None',
+                'user': rng.choice(['None', f"user{i % 500}"]),
+                'firstSeen': first_seen,
+                'lastSeen': first_seen + rng.randint(0, 86400),
+                'os': rng.choice(OS_NAMES),
+                'ssid': rng.choice(SSIDS)
+                })
+        networks.append(clients)
+
+    return networks
+
+
+# The export path before writers existed: reopen the file in append mode for every network.
+def Datatocsv(file_name: str, dataList: list):
+    with open(file_name, 'a', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file, delimiter=';')
+        for Info in dataList:
+            writer.writerow(Info.values())
+
+    return None
+
+
+def write_csv_append(file_name: str, networks: list):
+    with open(file_name, 'w', newline='', encoding='utf-8') as csv_file:
+        csv.writer(csv_file, delimiter=';').writerow(headers(CLIENT_COLUMNS))
+    for clients in networks:
+        Datatocsv(file_name, clients)
+
+    return None
+
+
+def write_with_writer(base_name: str, networks: list, output_format: str):
+    writer = open_writer(base_name, CLIENT_COLUMNS, output_format)
+    for clients in networks:
+        writer.writerows(client.values() for client in clients)
+    writer.close()
+
+    return None
+
+
+def reload(file_name: str, output_format: str):
+    if output_format == 'csv':
+        with open(file_name, 'r', newline='', encoding='utf-8') as csv_file:
+            return sum(1 for _ in csv.reader(csv_file, delimiter=';')) - 1
+    if output_format == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(file_name).num_rows
+
+    import pyarrow.ipc
+    return pyarrow.ipc.open_stream(file_name).read_all().num_rows
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    networks = synthetic_clients(rows)
+    total = sum(len(clients) for clients in networks)
+    print(f"{total} client rows in {NETWORKS} networks\n")
+    print(f"{'format':<22}{'write s':>10}{'size MB':>10}{'reload s':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cases = [('csv (Datatocsv)', 'csv', None), ('csv (writer)', 'csv', 'csv')]
+        if pyarrow is not None:
+            cases += [('parquet', 'parquet', 'parquet'), ('arrow', 'arrow', 'arrow')]
+        else:
+            print("pyarrow is not installed, skipping the parquet and arrow formats.\n")
+
+        for label, output_format, writer_format in cases:
+            base_name = os.path.join(directory, label.split(' ')[0] + ('_append' if writer_format is None else ''))
+            file_name = f"{base_name}.{EXTENSIONS[output_format]}"
+            start = time.perf_counter()
+            if writer_format is None:
+                write_csv_append(file_name, networks)
+            else:
+                write_with_writer(base_name, networks, writer_format)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            loaded = reload(file_name, output_format)
+            reload_time = time.perf_counter() - start
+            assert loaded == total, (label, loaded)
+
+            size = os.path.getsize(file_name) / 1e6
+            print(f"{label:<22}{write_time:>10.2f}{size:>10.1f}{reload_time:>10.2f}")
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
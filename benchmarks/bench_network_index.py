@@ -0,0 +1,95 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network_index import NetworkIndex, search_query
+
+# Benchmark of the network search index against the linear scan filterNetworks used before.
+# Builds a synthetic organization of 100k networks and times the same searches both ways.
+#
+# Run from the repository root:  python benchmarks/bench_network_index.py
+
+NETWORK_COUNT = 100000
+CITIES = ['helsinki', 'espoo', 'tampere', 'vantaa', 'oulu', 'turku', 'jyvaskyla', 'lahti', 'kuopio', 'pori']
+KINDS = ['store', 'office', 'warehouse', 'clinic', 'school', 'depot']
+TAGS = ['retail', 'hq', 'lab', 'guest', 'pilot', 'legacy', 'mx', 'mr', 'ms', 'camera']
+REPEATS = 200
+
+
+def synthetic_networks(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    networks = []
+    for i in range(count):
+        name = f"{rng.choice(CITIES).title()} {rng.choice(KINDS).title()} {i:06d}"
+        networks.append({'id': f"N_{i}", 'name': name, 'tags': rng.sample(TAGS, rng.randint(0, 3))})
+
+    return networks
+
+
+# The filterNetworks body the index replaces.
+def linear_search(org_networks: list, search_keywords: list, filter_keywords: list, tags_keywords: list):
+    network_results = []
+    filter_keywords_set = set(filter_keywords)
+    tags_keywords_set = set(tags_keywords)
+
+    for network in org_networks:
+        network_name = network['name'].lower()
+        network_tags = set(tag.lower() for tag in network.get('tags', []))
+
+        name_matches = all(keyword in network_name for keyword in search_keywords)
+        name_excludes = not any(filter_word in network_name for filter_word in filter_keywords_set)
+        tags_match = tags_keywords_set.issubset(network_tags)
+
+        if name_matches and name_excludes and (not tags_keywords or tags_match):
+            network_results.append(network)
+
+    return sorted(network_results, key=lambda x: x['name'])
+
+
+def timed(func, repeats: int):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main():
+    networks = synthetic_networks(NETWORK_COUNT)
+
+    start = time.perf_counter()
+    index = NetworkIndex(networks)
+    print(f"Built index over {NETWORK_COUNT} networks in {time.perf_counter() - start:.2f} s")
+
+    searches = [
+        (['012345'], [], []),
+        (['helsinki', '0999'], [], []),
+        (['tampere', 'clinic'], [], ['pilot', 'lab']),
+        (['depot'], ['oulu', 'lahti'], ['camera']),
+        (['kuopio school 04'], [], []),
+        ([], [], ['retail', 'hq', 'guest']),
+    ]
+
+    print(f"\n{'search':<48}{'matches':>8}{'linear ms':>12}{'index ms':>12}")
+    for search_keywords, filter_keywords, tags_keywords in searches:
+        linear_time, expected = timed(
+            lambda: linear_search(networks, search_keywords, filter_keywords, tags_keywords), 3)
+        index_time, result = timed(
+            lambda: index.search(search_keywords, filter_keywords, tags_keywords), REPEATS)
+        assert result == expected, search_keywords
+        label = str(search_query(search_keywords, filter_keywords, tags_keywords)[1:])[:46]
+        print(f"{label:<48}{len(result):>8}{linear_time * 1000:>12.2f}{index_time * 1000:>12.3f}")
+
+    query = ('and', ('or', ('name', 'espoo'), ('name', 'vantaa')), ('tag', 'mx'), ('not', ('tag', 'legacy')),
+             ('name', '1234'))
+    index_time, result = timed(lambda: index.query(query), REPEATS)
+    print(f"\nBoolean query {query}\n  {len(result)} matches in {index_time * 1000:.3f} ms")
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
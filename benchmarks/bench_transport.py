@@ -0,0 +1,117 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import meraki
+
+from dashboard_simulator import LATENCY, Simulator
+from dashboard_client import get_dashboard
+from metrics import metrics
+from rate_limiter import RateLimiter
+
+# Benchmark of the HTTP transport against the local Dashboard simulator: worker threads read
+# the devices and clients of every network through the rate limiter, with
+#   per-worker   a Dashboard client with SDK defaults for every worker
+#   shared       one client with SDK defaults shared by the workers (the scripts before
+#                dashboard_client)
+#   pooled       the shared, pooled client of dashboard_client
+# Reports wall time, connections the simulator accepted, bytes it sent and failed calls.
+# --handshake adds a delay to every new connection like a TLS handshake, --error-rate makes
+# that share of the reads fail with 503 to compare the retry policies.
+#
+# Run from the repository root:
+#   python benchmarks/bench_transport.py --networks 200 --workers 8 --handshake 0.05 --error-rate 0.02
+
+SETUPS = ['per-worker', 'shared', 'pooled']
+RATE = 1000                 # Requests per second allowed by the simulator and the rate limiter
+
+
+def sdk_dashboard(base_url: str):
+    return meraki.DashboardAPI('simulator', base_url=base_url, wait_on_rate_limit=False, suppress_logging=True)
+
+
+def run_setup(setup: str, simulator: Simulator, networks: list, workers: int):
+    limiter = RateLimiter(rate=RATE, burst=RATE)
+    shared = None
+    if setup == 'shared':
+        shared = sdk_dashboard(simulator.base_url)
+    elif setup == 'pooled':
+        shared = get_dashboard('simulator', simulator.base_url, suppress_logging=True)
+    chunks = [networks[i::workers] for i in range(workers)]
+
+    def worker(chunk):
+        dashboard = shared or sdk_dashboard(simulator.base_url)
+        failed = 0
+        for network in chunk:
+            for call, kwargs in ((dashboard.networks.getNetworkDevices, {}),
+                                 (dashboard.networks.getNetworkClients, {'perPage': 1000, 'total_pages': 'all'})):
+                try:
+                    limiter.call(call, network['id'], **kwargs)
+                except meraki.APIError:
+                    failed += 1
+        return failed
+
+    metrics.reset()
+    simulator.dashboard.reset_stats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        failed = sum(executor.map(worker, chunks))
+    elapsed = time.perf_counter() - started
+    stats = simulator.dashboard.stats()
+
+    return {
+        'setup': setup,
+        'seconds': round(elapsed, 2),
+        'requests': stats['requests'],
+        'requests_per_second': round(stats['requests'] / elapsed, 1),
+        'connections': stats['connections'],
+        'bytes_sent': stats['bytes_sent'],
+        'server_errors': stats['server_errors'],
+        'failed_calls': failed,
+        'retries': metrics.snapshot()['retries']
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTTP transport against the Dashboard simulator.")
+    parser.add_argument('--networks', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--setups', default=','.join(SETUPS), help="comma separated: per-worker, shared, pooled")
+    parser.add_argument('--latency', type=float, default=LATENCY, help="seconds added to every response")
+    parser.add_argument('--handshake', type=float, default=0.05, help="seconds added to every new connection")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of reads that fail with 503")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    sdk_logger = logging.getLogger('meraki')
+    sdk_logger.addHandler(logging.NullHandler())
+    sdk_logger.propagate = False
+    results = []
+    print(f"{'Setup':<11} {'Seconds':>8} {'Requests':>9} {'Req/s':>7} {'Conns':>6} {'MB sent':>8} "
+          f"{'503s':>5} {'Retries':>7} {'Failed':>6}")
+    with Simulator({'1': args.networks}, latency=args.latency, handshake=args.handshake, rate=RATE, burst=RATE,
+                   error_rate=args.error_rate) as simulator:
+        networks = simulator.dashboard.organizations['1'].networks
+        for setup in args.setups.split(','):
+            result = run_setup(setup, simulator, networks, args.workers)
+            results.append(result)
+            print(f"{setup:<11} {result['seconds']:>8.2f} {result['requests']:>9} "
+                  f"{result['requests_per_second']:>7.1f} {result['connections']:>6} "
+                  f"{result['bytes_sent'] / 1e6:>8.2f} {result['server_errors']:>5} {result['retries']:>7} "
+                  f"{result['failed_calls']:>6}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the benchmark's network lists, indexes and snapshots out of the user's cache.
+os.environ['MERAKI_CACHE_DIR'] = tempfile.mkdtemp(prefix='meraki_bench_cache_')
+
+from dashboard_simulator import LATENCY, RATE, Simulator
+from batch_runner import run_job
+from network_cache import invalidate
+from rate_limiter import RateLimiter
+
+# End-to-end benchmark of the script workflows against the local Dashboard simulator.
+# Each workflow runs headless through the batch runner, so it exercises the same code as a
+# real run: network search, rate limiting, pagination, retries and action batch polling.
+# Every workflow starts with a cold cache; with --repeat the later runs reuse what the first
+# left behind (network index, snapshots, client counts). Reports wall time, request count
+# and 429 rate. --busy-share gives that fraction of the networks a long client history.
+#
+# Run from the repository root:
+#   python benchmarks/bench_workflows.py --sizes 10,100,1000 --workflows export,syslog,ssid
+#
+# The simulator allows 10 requests per second per organization like the Dashboard, and the
+# scripts' rate limiter is given the same budget, so large sizes take as long as they would
+# in production (50,000 networks is several hours). Raise --rate to measure the scripts' own
+# overhead at those sizes instead. The SDK's own per-organization throttling ("smart flow")
+# is turned off by dashboard_client, so --rate is the only limit.
+
+WORKFLOWS = ['export', 'syslog', 'ssid']
+API_KEY_ENV = 'MERAKI_BENCH_API_KEY'
+RADIUS_SECRET_ENV = 'MERAKI_BENCH_RADIUS_SECRET'
+
+
+def workflow_job(workflow: str, org_id: str, number: int, options: dict):
+    job = {'org_id': org_id, 'job': workflow, 'number': number, 'api_key_env': API_KEY_ENV, 'options': options}
+    if workflow == 'ssid':
+        job['ssid'] = {'name': 'Office', 'radius_host': '10.0.0.5', 'radius_secret_env': RADIUS_SECRET_ENV}
+
+    return dict(job)
+
+
+def run_size(size: int, workflows: list, args, output_dir: str):
+    org_id = str(size)
+    results = []
+    with Simulator({org_id: size}, latency=args.latency, rate=args.rate, burst=args.rate,
+                   busy_share=args.busy_share) as simulator:
+        for number, workflow in enumerate(workflows):
+            invalidate(org_id)
+            options = {'BASE_URL': simulator.base_url}
+            if workflow == 'export':
+                options['EXPORT_MODE'] = args.export_mode
+            for run in range(1, args.repeat + 1):
+                limiter = RateLimiter(rate=args.rate, burst=args.rate)
+                simulator.dashboard.reset_stats()
+                started = time.perf_counter()
+                result = run_job(workflow_job(workflow, org_id, number, options), limiter, output_dir)
+                elapsed = time.perf_counter() - started
+                stats = simulator.dashboard.stats()
+                results.append({
+                    'networks': size,
+                    'workflow': workflow,
+                    'run': run,
+                    'status': result['status'],
+                    'seconds': round(elapsed, 2),
+                    'requests': stats['requests'],
+                    'rate_limited': stats['rate_limited'],
+                    'rate_limited_share': round(stats['rate_limited'] / max(1, stats['requests']), 4),
+                    'requests_per_second': round(stats['requests'] / elapsed, 1),
+                    'endpoints': stats['endpoints'],
+                    'error': result.get('error')
+                    })
+                print_result(results[-1])
+
+    return list(results)
+
+
+def print_result(result: dict):
+    print(f"{result['networks']:>8} {result['workflow']:<8} {result['run']:>3} {result['status']:<6} {result['seconds']:>9.2f} "
+          f"{result['requests']:>9} {result['rate_limited']:>7} {result['rate_limited_share']:>7.1%} "
+          f"{result['requests_per_second']:>8.1f}  {result['error'] or ''}")
+
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the script workflows against the Dashboard simulator.")
+    parser.add_argument('--sizes', default='10,100,1000', help="comma separated network counts")
+    parser.add_argument('--workflows', default=','.join(WORKFLOWS), help="comma separated: export, syslog, ssid")
+    parser.add_argument('--rate', type=float, default=RATE, help="requests per second per organization")
+    parser.add_argument('--latency', type=float, default=LATENCY, help="seconds added to every response")
+    parser.add_argument('--export-mode', default='async', help="EXPORT_MODE of the export workflow")
+    parser.add_argument('--busy-share', type=float, default=0.0,
+                        help="fraction of networks with a long client history (see dashboard_simulator.BUSY_CLIENTS)")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="runs of each workflow; caches are only cleared before the first")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    workflows = [workflow for workflow in args.workflows.split(',') if workflow in WORKFLOWS]
+    os.environ[API_KEY_ENV] = 'simulator'
+    os.environ[RADIUS_SECRET_ENV] = 'simulator-secret'
+    output_dir = tempfile.mkdtemp(prefix='meraki_bench_')
+    # The SDK only adds its console and file log handlers when the logger has none.
+    sdk_logger = logging.getLogger('meraki')
+    sdk_logger.addHandler(logging.NullHandler())
+    sdk_logger.propagate = False
+    # It still creates an empty log file in the working directory for every client.
+    json_path = os.path.abspath(args.json) if args.json else None
+    os.chdir(output_dir)
+
+    print(f"{'Networks':>8} {'Workflow':<8} {'Run':>3} {'Status':<6} {'Seconds':>9} {'Requests':>9} {'429s':>7} "
+          f"{'429 %':>7} {'Req/s':>8}")
+    results = []
+    for size in sizes:
+        results.extend(run_size(size, workflows, args, output_dir))
+    print(f"Logs and exports in {output_dir}")
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
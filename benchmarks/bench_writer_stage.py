@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_export_formats import Datatocsv, synthetic_clients, write_csv_append
+from export_schema import CLIENT_COLUMNS
+from export_writers import WRITE_BUFFER, open_writer, output_name, zstandard
+from metrics import metrics
+from writer_stage import WriterStage
+
+# Benchmark of the client export's write path. Every network is "fetched" (a sleep of
+# --fetch-delay standing in for its API calls) and its rows are then written with
+#   append        the old per-network Datatocsv: the CSV is reopened in append mode per network
+#   writer        one CSV writer for the run, written on the fetching thread
+#   stage         the same writer behind writer_stage.WriterStage
+#   stage-gzip    the stage writing gzip compressed CSV
+#   stage-zstd    the stage writing zstd compressed CSV (needs zstandard)
+# Reports wall time, rows per second, bytes on disk and how long fetching waited on writes.
+#
+# Run from the repository root:
+#   python benchmarks/bench_writer_stage.py --rows 1000000 --fetch-delay 0.01
+
+CASES = ['append', 'writer', 'stage', 'stage-gzip', 'stage-zstd']
+
+
+def run_case(case: str, networks: list, directory: str, fetch_delay: float, buffer_size: int):
+    base_name = os.path.join(directory, case)
+    compression = case.split('-')[1] if '-' in case else None
+    file_name = output_name(base_name, 'csv', compression)
+    stage = None
+    if case == 'append':
+        write_csv_append(file_name, [])
+    else:
+        writer = open_writer(base_name, CLIENT_COLUMNS, 'csv', compression=compression, buffer_size=buffer_size)
+    if case.startswith('stage'):
+        stage = WriterStage()
+        writer = stage.writer(writer)
+
+    metrics.reset()
+    waited = 0.0
+    started = time.perf_counter()
+    for clients in networks:
+        time.sleep(fetch_delay)
+        write_started = time.perf_counter()
+        if case == 'append':
+            Datatocsv(file_name, clients)
+        else:
+            writer.writerows([tuple(client.values()) for client in clients])
+        waited += time.perf_counter() - write_started
+    if stage is not None:
+        stage.close()
+    if case != 'append':
+        writer.close()
+    elapsed = time.perf_counter() - started
+    rows = sum(len(clients) for clients in networks)
+
+    return {
+        'case': case,
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(rows / elapsed),
+        'bytes_written': os.path.getsize(file_name),
+        'fetch_waited_seconds': round(waited, 2),
+        'queue_full_seconds': round(metrics.snapshot()['sleep_seconds'].get('write_queue', 0.0), 2)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the export write path and compressed output.")
+    parser.add_argument('--rows', type=int, default=500000, help="client rows, spread over 200 networks")
+    parser.add_argument('--fetch-delay', type=float, default=0.01, help="seconds each network takes to fetch")
+    parser.add_argument('--buffer-size', type=int, default=WRITE_BUFFER, help="bytes buffered before compressing")
+    parser.add_argument('--cases', default=','.join(CASES), help="comma separated: " + ', '.join(CASES))
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    networks = synthetic_clients(args.rows)
+    print(f"{sum(len(clients) for clients in networks)} client rows in {len(networks)} networks, "
+          f"{args.fetch_delay * len(networks):.1f} s of fetching\n")
+    print(f"{'Case':<12} {'Seconds':>8} {'Rows/s':>9} {'MB written':>11} {'Fetch waited s':>15} {'Queue full s':>13}")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for case in args.cases.split(','):
+            if case == 'stage-zstd' and zstandard is None:
+                print("zstandard is not installed, skipping stage-zstd.")
+                continue
+            result = run_case(case, networks, directory, args.fetch_delay, args.buffer_size)
+            results.append(result)
+            print(f"{case:<12} {result['seconds']:>8.2f} {result['rows_per_second']:>9} "
+                  f"{result['bytes_written'] / 1e6:>11.1f} {result['fetch_waited_seconds']:>15.2f} "
+                  f"{result['queue_full_seconds']:>13.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+import gzip
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the Dashboard API endpoints the scripts use, for benchmarks.
+# Every organization gets synthetic networks with devices, clients, appliance SSIDs and
+# syslog servers. Responses are delayed by a configurable latency, listings are paginated
+# with Link headers like the real API, each organization has its own token bucket that
+# answers 429 with Retry-After when it is empty, and action batches complete after a delay.
+# Optionally every new connection costs a handshake delay (like TLS), a share of the GET
+# requests fail with 503, and responses are gzip compressed for clients that accept it.
+#
+# Point a script at it with BASE_URL = 'http://127.0.0.1:<port>/api/v1', or run it on its own:
+#   python benchmarks/dashboard_simulator.py [networks] [port]
+
+API_PREFIX = '/api/v1'
+RATE = 10                   # Requests per second per organization, as on the Dashboard
+BURST = 10                  # Requests an idle organization can make at once
+LATENCY = 0.02              # Seconds added to every response
+JITTER = 0.01               # Random extra latency, up to this many seconds
+BATCH_DELAY = 0.5           # Seconds before an action batch completes
+BATCH_ACTION_DELAY = 0.005  # Extra seconds per action in a batch
+MAX_RUNNING_BATCHES = 5     # Asynchronous batches an organization may have running
+DEVICES_PER_NETWORK = 4
+CLIENTS_PER_NETWORK = 40
+BUSY_CLIENTS = 20000        # Clients of a busy network, see busy_share
+GZIP_MIN_BYTES = 1024       # Smaller responses are sent uncompressed
+WAN_FIELDS = ('wan1Ip', 'wan2Ip')   # Appliance fields only the per-network device listing has
+
+# Roles the syslog endpoint only accepts when the network has the product type.
+ROLE_PRODUCT_TYPES = {
+    'Air Marshal events': 'wireless',
+    'Wireless event log': 'wireless',
+    'Switch event log': 'switch',
+    'Security events': 'appliance'
+    }
+PRODUCT_MIXES = [
+    ['appliance'],
+    ['appliance', 'switch'],
+    ['appliance', 'switch', 'wireless'],
+    ['wireless'],
+    ['camera', 'switch']
+    ]
+CITIES = ['Helsinki', 'Espoo', 'Tampere', 'Turku', 'Oulu', 'Vantaa', 'Lahti', 'Kuopio']
+TAGS = ['store', 'office', 'warehouse', 'pilot', 'legacy']
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+# The recentDevice fields of a client last connected to `device`.
+def recent_device(device: dict):
+    return {
+        'recentDeviceSerial': device['serial'],
+        'recentDeviceName': device['name'],
+        'recentDeviceMac': device['mac'],
+        'recentDeviceConnection': 'Wireless' if device['model'].startswith('MR') else 'Wired'
+        }
+
+
+class Organization:
+    # busy_share is the fraction of networks with BUSY_CLIENTS clients instead of CLIENTS_PER_NETWORK.
+    def __init__(self, org_id: str, networks: int, seed: int = 1, busy_share: float = 0.0):
+        rng = random.Random(f"{org_id}-{seed}")
+        now = int(time.time())
+        self.id = org_id
+        self.networks = []
+        self.devices = {}
+        self.clients = {}
+        self.ssids = {}
+        self.syslog = {}
+        self.batches = {}
+
+        for i in range(networks):
+            network_id = f"L_{org_id}_{i}"
+            product_types = rng.choice(PRODUCT_MIXES)
+            clients = BUSY_CLIENTS if rng.random() < busy_share else CLIENTS_PER_NETWORK
+            self.networks.append({
+                'id': network_id,
+                'organizationId': org_id,
+                'name': f"{rng.choice(CITIES)}-{rng.choice(['Store', 'Office', 'Depot'])}-{i:05d}",
+                'productTypes': product_types,
+                'tags': rng.sample(TAGS, rng.randint(0, 2)),
+                'timeZone': 'Europe/Helsinki'
+                })
+            self.devices[network_id] = [{
+                'name': f"dev-{i}-{d}",
+                'model': rng.choice(['MX68', 'MS120-8', 'MR36', 'MV12W']),
+                'serial': f"Q2{i:06d}{d:02d}",
+                'firmware': rng.choice(['wired-18-107', 'switch-16-8', 'wireless-29-7']),
+                'mac': f"e0:55:3d:{i % 256:02x}:{i // 256 % 256:02x}:{d:02x}",
+                'lanIp': f"10.{i % 256}.{i // 256 % 256}.{d + 1}",
+                'networkId': network_id
+                } for d in range(DEVICES_PER_NETWORK)]
+            for d, device in enumerate(self.devices[network_id]):
+                if device['model'].startswith('MX'):
+                    device['wan1Ip'] = f"198.51.{i % 256}.{d + 1}"
+                    device['wan2Ip'] = None
+            self.clients[network_id] = [{
+                'id': f"k{i:06d}{c:04d}",
+                'mac': f"12:34:{i % 256:02x}:{i // 256 % 256:02x}:{c // 256 % 256:02x}:{c % 256:02x}",
+                'description': rng.choice([f"host-{c}", None]),
+                'ip': f"10.{i % 256}.{c // 256 % 256}.{c % 256}",
+                'ip6': None,
+                'user': rng.choice([None, f"user{c}"]),
+                'firstSeen': now - rng.randint(86400, 2678400),
+                'lastSeen': now - rng.randint(0, 2678400),
+                'os': rng.choice(['iOS', 'Android', 'Windows 10', 'macOS', None]),
+                'ssid': rng.choice(['Office', 'Guest', None]),
+                **recent_device(rng.choice(self.devices[network_id]))
+                } for c in range(clients)]
+            self.ssids[network_id] = [{
+                'number': n,
+                'name': ['Office', 'Guest', 'IoT', f"Unconfigured SSID {n + 1}"][n],
+                'enabled': n < 3,
+                'authMode': '8021x-radius' if n == 0 else 'psk',
+                'radiusServers': [{'host': '10.0.0.1', 'port': 1812}] if n == 0 else []
+                } for n in range(4)]
+            self.syslog[network_id] = [{'host': '10.9.9.9', 'port': 514, 'roles': ['Flows']}]
+
+        self.network_by_id = {network['id']: network for network in self.networks}
+        # The organization-wide listings split the appliances' WAN addresses off into the uplink statuses.
+        self.all_devices = [{field: value for field, value in device.items() if field not in WAN_FIELDS}
+                            for network in self.networks for device in self.devices[network['id']]]
+        self.uplink_statuses = [{
+            'networkId': device['networkId'],
+            'serial': device['serial'],
+            'model': device['model'],
+            'uplinks': [{'interface': field[:-2], 'status': 'active' if device[field] else 'not connected',
+                         'ip': device[field]} for field in WAN_FIELDS]
+            } for network in self.networks for device in self.devices[network['id']] if 'wan1Ip' in device]
+
+
+# Dashboard state and request handling, independent of the HTTP server.
+class Dashboard:
+    def __init__(self, organizations: dict, rate: float = RATE, burst: float = BURST,
+                 batch_delay: float = BATCH_DELAY, batch_action_delay: float = BATCH_ACTION_DELAY,
+                 busy_share: float = 0.0, error_rate: float = 0.0):
+        self.organizations = {str(org_id): Organization(str(org_id), networks, busy_share=busy_share)
+                              for org_id, networks in organizations.items()}
+        self.org_of_network = {network['id']: org
+                               for org in self.organizations.values() for network in org.networks}
+        self.rate = rate
+        self.burst = burst
+        self.batch_delay = batch_delay
+        self.batch_action_delay = batch_action_delay
+        self.error_rate = error_rate
+        self.buckets = {org_id: TokenBucket(rate, burst) for org_id in self.organizations}
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+        self.routes = [
+            ('GET', r'/organizations/([^/]+)/networks', self.get_org_networks),
+            ('GET', r'/organizations/([^/]+)/devices', self.get_org_devices),
+            ('GET', r'/organizations/([^/]+)/inventoryDevices', self.get_org_inventory),
+            ('GET', r'/organizations/([^/]+)/appliance/uplink/statuses', self.get_org_uplink_statuses),
+            ('POST', r'/organizations/([^/]+)/actionBatches', self.create_action_batch),
+            ('GET', r'/organizations/([^/]+)/actionBatches', self.get_action_batches),
+            ('GET', r'/organizations/([^/]+)/actionBatches/([^/]+)', self.get_action_batch),
+            ('GET', r'/networks/([^/]+)', self.get_network),
+            ('GET', r'/networks/([^/]+)/devices', self.get_network_devices),
+            ('GET', r'/networks/([^/]+)/clients', self.get_network_clients),
+            ('GET', r'/networks/([^/]+)/syslogServers', self.get_syslog_servers),
+            ('PUT', r'/networks/([^/]+)/syslogServers', self.update_syslog_servers),
+            ('GET', r'/networks/([^/]+)/appliance/ssids', self.get_appliance_ssids),
+            ('PUT', r'/networks/([^/]+)/appliance/ssids/([0-9]+)', self.update_appliance_ssid)
+            ]
+        self.routes = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in self.routes]
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.requests = 0
+            self.rate_limited = 0
+            self.server_errors = 0
+            self.connections = 0
+            self.bytes_sent = 0
+            self.endpoints = {}
+
+        return None
+
+    def stats(self):
+        with self.stats_lock:
+            return {'requests': self.requests, 'rate_limited': self.rate_limited,
+                    'server_errors': self.server_errors, 'connections': self.connections,
+                    'bytes_sent': self.bytes_sent, 'endpoints': dict(self.endpoints)}
+
+    def count(self, endpoint: str, limited: bool):
+        with self.stats_lock:
+            self.requests += 1
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+            if limited:
+                self.rate_limited += 1
+
+        return None
+
+    def connected(self):
+        with self.stats_lock:
+            self.connections += 1
+
+        return None
+
+    def sent(self, size: int):
+        with self.stats_lock:
+            self.bytes_sent += size
+
+        return None
+
+    def organization(self, org_id: str):
+        org = self.organizations.get(org_id)
+        if org is None:
+            raise ApiError(404, 'Organization not found')
+        return org
+
+    def network_org(self, network_id: str):
+        org = self.org_of_network.get(network_id)
+        if org is None:
+            raise ApiError(404, 'Network not found')
+        return org
+
+    # Returns (status, body, headers). `url` is the path the Link header of a paginated listing points to.
+    def handle(self, method: str, path: str, query: dict, body, url: str):
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if route_method != method or match is None:
+                continue
+            org_id = match.group(1)
+            org = self.organizations.get(org_id) if path.startswith('/organizations/') \
+                else self.org_of_network.get(org_id)
+            limited = org is not None and not self.buckets[org.id].take()
+            self.count(handler.__name__, limited)
+            if limited:
+                return 429, {'errors': ['API rate limit exceeded for organization']}, {'Retry-After': '1'}
+            if method == 'GET' and random.random() < self.error_rate:
+                with self.stats_lock:
+                    self.server_errors += 1
+                return 503, {'errors': ['Service unavailable']}, {}
+            try:
+                return handler(*match.groups(), query=query, body=body, url=url)
+            except ApiError as e:
+                return e.status, {'errors': [str(e)]}, {}
+
+        self.count('unknown', False)
+        return 404, {'errors': ['Not found']}, {}
+
+    # Slice a listing with perPage / startingAfter and add a Link header for the next page.
+    def page(self, items: list, query: dict, url: str, default_per_page: int, max_per_page: int):
+        per_page = max(1, min(max_per_page, int(query.get('perPage', default_per_page))))
+        start = int(query.get('startingAfter', 0))
+        end = start + per_page
+        headers = {}
+        if end < len(items):
+            next_query = dict(query, perPage=per_page, startingAfter=end)
+            next_url = f"{url}?{'&'.join(f'{key}={value}' for key, value in next_query.items())}"
+            headers['Link'] = f"<{next_url}>; rel=next"
+
+        return 200, items[start:end], headers
+
+    def get_org_networks(self, org_id, query, body, url):
+        return self.page(self.organization(org_id).networks, query, url, 1000, 100000)
+
+    def get_org_devices(self, org_id, query, body, url):
+        return self.page(self.organization(org_id).all_devices, query, url, 1000, 1000)
+
+    def get_org_uplink_statuses(self, org_id, query, body, url):
+        return self.page(self.organization(org_id).uplink_statuses, query, url, 1000, 1000)
+
+    def get_org_inventory(self, org_id, query, body, url):
+        self.organization(org_id)
+        return 200, [], {}
+
+    def get_network(self, network_id, query, body, url):
+        return 200, self.network_org(network_id).network_by_id[network_id], {}
+
+    def get_network_devices(self, network_id, query, body, url):
+        return 200, self.network_org(network_id).devices[network_id], {}
+
+    def get_network_clients(self, network_id, query, body, url):
+        since = time.time() - int(query.get('timespan', 86400))
+        clients = [client for client in self.network_org(network_id).clients[network_id] if client['lastSeen'] >= since]
+        return self.page(clients, query, url, 10, 5000)
+
+    def get_syslog_servers(self, network_id, query, body, url):
+        return 200, {'servers': self.network_org(network_id).syslog[network_id]}, {}
+
+    # Applies an update to the state, raising ApiError with the Dashboard's 400 message if it is invalid.
+    def apply_syslog(self, org: Organization, network_id: str, body: dict):
+        product_types = org.network_by_id[network_id]['productTypes']
+        for server in body.get('servers', []):
+            for role in server.get('roles', []):
+                if role in ROLE_PRODUCT_TYPES and ROLE_PRODUCT_TYPES[role] not in product_types:
+                    raise ApiError(400, f"'{role}' is not a valid role for this network")
+        org.syslog[network_id] = list(body.get('servers', []))
+
+        return {'servers': org.syslog[network_id]}
+
+    def apply_ssid(self, org: Organization, network_id: str, number: int, body: dict):
+        ssids = org.ssids[network_id]
+        if number >= len(ssids):
+            raise ApiError(404, 'SSID not found')
+        ssid = dict(ssids[number])
+        ssid.update({key: value for key, value in body.items() if key != 'radiusServers'})
+        if 'radiusServers' in body:
+            ssid['radiusServers'] = [{'host': server['host'], 'port': server.get('port', 1812)}
+                                     for server in body['radiusServers']]
+        ssids[number] = ssid
+
+        return ssid
+
+    def update_syslog_servers(self, network_id, query, body, url):
+        org = self.network_org(network_id)
+        with self.lock:
+            return 200, self.apply_syslog(org, network_id, body or {}), {}
+
+    def get_appliance_ssids(self, network_id, query, body, url):
+        return 200, self.network_org(network_id).ssids[network_id], {}
+
+    def update_appliance_ssid(self, network_id, number, query, body, url):
+        org = self.network_org(network_id)
+        with self.lock:
+            return 200, self.apply_ssid(org, network_id, int(number), body or {}), {}
+
+    # Run every action of a batch once its delay has passed. A failing action fails the whole
+    # batch and none of its changes are kept, like the Dashboard does.
+    def settle(self, org: Organization, batch: dict):
+        if batch['status']['completed'] or batch['status']['failed'] or time.monotonic() < batch['due']:
+            return None
+
+        touched = {action['resource'].strip('/').split('/')[1] for action in batch['actions']}
+        saved = [(network_id, list(org.syslog.get(network_id, [])), list(org.ssids.get(network_id, [])))
+                 for network_id in touched if network_id in org.network_by_id]
+        try:
+            for action in batch['actions']:
+                parts = action['resource'].strip('/').split('/')
+                if len(parts) == 3 and parts[2] == 'syslogServers':
+                    self.apply_syslog(org, parts[1], action['body'])
+                elif len(parts) == 5 and parts[2:4] == ['appliance', 'ssids']:
+                    self.apply_ssid(org, parts[1], int(parts[4]), action['body'])
+                else:
+                    raise ApiError(400, f"Unsupported action resource {action['resource']}")
+        except (ApiError, KeyError, IndexError, ValueError) as e:
+            for network_id, syslog, ssids in saved:
+                org.syslog[network_id] = syslog
+                org.ssids[network_id] = ssids
+            batch['status'].update(failed=True, errors=[str(e)])
+        else:
+            batch['status']['completed'] = True
+
+        return None
+
+    def batch_view(self, batch: dict):
+        return {key: value for key, value in batch.items() if key != 'due'}
+
+    def create_action_batch(self, org_id, query, body, url):
+        org = self.organization(org_id)
+        body = body or {}
+        actions = body.get('actions', [])
+        synchronous = body.get('synchronous', False)
+        with self.lock:
+            for batch in org.batches.values():
+                self.settle(org, batch)
+            if len(actions) > (20 if synchronous else 100):
+                raise ApiError(400, 'Too many actions in the batch')
+            running = [batch for batch in org.batches.values()
+                       if batch['confirmed'] and not batch['status']['completed'] and not batch['status']['failed']]
+            if not synchronous and len(running) >= MAX_RUNNING_BATCHES:
+                raise ApiError(400, f"Too many concurrently executing batches. Maximum is {MAX_RUNNING_BATCHES}")
+            batch_id = str(len(org.batches) + 1)
+            batch = {
+                'id': batch_id,
+                'organizationId': org_id,
+                'confirmed': body.get('confirmed', False),
+                'synchronous': synchronous,
+                'status': {'completed': False, 'failed': False, 'errors': []},
+                'actions': actions,
+                'due': time.monotonic() + (0 if synchronous else self.batch_delay + self.batch_action_delay * len(actions))
+                }
+            org.batches[batch_id] = batch
+            if synchronous:
+                self.settle(org, batch)
+
+            return 201, self.batch_view(batch), {}
+
+    def get_action_batches(self, org_id, query, body, url):
+        org = self.organization(org_id)
+        with self.lock:
+            batches = list(org.batches.values())
+            for batch in batches:
+                self.settle(org, batch)
+        if query.get('status') == 'pending':
+            batches = [batch for batch in batches if not batch['status']['completed'] and not batch['status']['failed']]
+        elif query.get('status') == 'completed':
+            batches = [batch for batch in batches if batch['status']['completed']]
+        elif query.get('status') == 'failed':
+            batches = [batch for batch in batches if batch['status']['failed']]
+
+        return 200, [self.batch_view(batch) for batch in batches], {}
+
+    def get_action_batch(self, org_id, batch_id, query, body, url):
+        org = self.organization(org_id)
+        with self.lock:
+            batch = org.batches.get(batch_id)
+            if batch is None:
+                raise ApiError(404, 'Action batch not found')
+            self.settle(org, batch)
+            return 200, self.batch_view(batch), {}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.dashboard.connected()
+        time.sleep(self.server.handshake)
+
+        return None
+
+    def respond(self, method: str):
+        server = self.server
+        parts = urlsplit(self.path)
+        path = parts.path[len(API_PREFIX):] if parts.path.startswith(API_PREFIX) else parts.path
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        # The SDK only follows absolute links on Meraki domains and prefixes anything else
+        # with its base URL, so pagination links are given relative to the API prefix.
+        url = path
+
+        time.sleep(server.latency + random.random() * server.jitter)
+        status, payload, headers = server.dashboard.handle(method, path, query, body, url)
+        data = json.dumps(payload).encode('utf-8')
+        compress = len(data) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compress:
+            data = gzip.compress(data, compresslevel=5)
+        server.dashboard.sent(len(data))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+        return None
+
+    def do_GET(self):
+        return self.respond('GET')
+
+    def do_POST(self):
+        return self.respond('POST')
+
+    def do_PUT(self):
+        return self.respond('PUT')
+
+    def log_message(self, format, *args):
+        return None
+
+
+# Runs the simulated Dashboard in a background thread:
+#   with Simulator({'1': 1000}) as simulator:
+#       dashboard = meraki.DashboardAPI(key, base_url=simulator.base_url)
+class Simulator:
+    def __init__(self, organizations: dict, port: int = 0, latency: float = LATENCY, jitter: float = JITTER,
+                 handshake: float = 0.0, **options):
+        self.dashboard = Dashboard(organizations, **options)
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), RequestHandler)
+        self.server.daemon_threads = True
+        self.server.dashboard = self.dashboard
+        self.server.latency = latency
+        self.server.jitter = jitter
+        self.server.handshake = handshake
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}{API_PREFIX}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+        return None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+        return None
+
+
+if __name__ == "__main__":
+    networks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    simulator = Simulator({'1': networks}, port=port)
+    print(f"Simulated Dashboard with {networks} networks in organization 1 at {simulator.base_url}")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        print(simulator.dashboard.stats())
@@ -0,0 +1,52 @@
+import json
+import os
+
+from network_cache import CACHE_DIR, cache_path
+
+# Client counts per network from the last export. getNetworkClients pages forward with a
+# server cursor (it has t0 and timespan but no end time, so a month can not be split into
+# windows that are fetched side by side), which means a busy network's pages always come one
+# after another. The counts let the export size each network's pages to its density, so a
+# busy network needs a handful of large pages instead of hundreds of small ones, and start
+# the busiest networks first, so they run alongside the others instead of after them.
+
+MAX_CLIENTS_PER_PAGE = 5000     # Largest page getNetworkClients returns
+GROWTH = 1.1                    # Headroom over last run's count when sizing a network's pages
+
+
+class ClientCounts:
+    def __init__(self, org_id):
+        self.path = cache_path(org_id, 'client_counts')
+        try:
+            with open(self.path, 'r', encoding='utf-8') as counts_file:
+                self.counts = json.load(counts_file)
+        except (OSError, ValueError):
+            self.counts = {}
+
+    # Page size for a network: big enough for all of its clients in one page if it allows,
+    # never smaller than `default`, which is also used for networks not seen before.
+    def per_page(self, network_id: str, default: int):
+        count = self.counts.get(network_id)
+        if count is None:
+            return default
+
+        return max(default, min(MAX_CLIENTS_PER_PAGE, int(count * GROWTH) + 1))
+
+    # The networks ordered by their client count, busiest first. Networks not seen before
+    # keep their place among the ones with few clients.
+    def busiest_first(self, networks: list):
+        return sorted(networks, key=lambda network: -self.counts.get(network['id'], 0))
+
+    def record(self, network_id: str, count: int):
+        self.counts[network_id] = count
+
+        return None
+
+    def save(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as counts_file:
+            json.dump(self.counts, counts_file)
+        os.replace(temp_path, self.path)
+
+        return None
@@ -0,0 +1,137 @@
+import difflib
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from network_cache import CACHE_DIR, cache_path
+
+# Local snapshots of the network configs a script changes (syslog servers, SSIDs).
+# Every network has the config it was last seen with and a content hash of it and of the
+# config last applied to it. While a snapshot is younger than the TTL and the last change
+# did not fail, the change plan is worked out from the snapshot instead of the live config,
+# so a re-run only reads the networks that are stale or failed before. Dry runs print the
+# plan as a diff from the same snapshots.
+
+SNAPSHOT_TTL = 86400        # Seconds a snapshot is trusted without reading the live config, 0 = always read
+
+
+def content_hash(config):
+    text = json.dumps(config, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class SnapshotStore:
+    def __init__(self, org_id, kind: str, ttl: float = SNAPSHOT_TTL):
+        self.path = cache_path(org_id, f"snapshots_{kind}")
+        self.ttl = ttl
+        try:
+            with open(self.path, 'r', encoding='utf-8') as snapshot_file:
+                self.snapshots = json.load(snapshot_file)
+        except (OSError, ValueError):
+            self.snapshots = {}
+
+    # Snapshot of a network that can be used instead of the live config, or None.
+    def fresh(self, network_id: str, now: float = None):
+        snapshot = self.snapshots.get(network_id)
+        now = time.time() if now is None else now
+        if snapshot is None or snapshot['failed'] or now - snapshot['checked'] > self.ttl:
+            return None
+
+        return snapshot
+
+    # Record the live config of a network.
+    def seen(self, network_id: str, config):
+        previous = self.snapshots.get(network_id, {})
+        self.snapshots[network_id] = {
+            'config': config,
+            'known': content_hash(config),
+            'applied': previous.get('applied'),
+            'checked': time.time(),
+            'failed': False
+            }
+
+        return None
+
+    # Record a config that was applied to a network.
+    def applied(self, network_id: str, config):
+        config_hash = content_hash(config)
+        self.snapshots[network_id] = {
+            'config': config,
+            'known': config_hash,
+            'applied': config_hash,
+            'checked': time.time(),
+            'failed': False
+            }
+
+        return None
+
+    # A change that failed or is still pending: read the live config on the next run.
+    def failed(self, network_id: str):
+        if network_id in self.snapshots:
+            self.snapshots[network_id]['failed'] = True
+
+        return None
+
+    # True if the network no longer has the config that was last applied to it.
+    def drifted(self, network_id: str):
+        snapshot = self.snapshots.get(network_id)
+        return snapshot is not None and snapshot['applied'] is not None and snapshot['applied'] != snapshot['known']
+
+    def save(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(self.snapshots, snapshot_file)
+        os.replace(temp_path, self.path)
+
+        return None
+
+
+# Yield (network, config) for every network whose config is known: fresh snapshots first, then
+# the live configs read with `read` in a pool as they arrive. `read` returns None on errors and
+# those networks are left out. Live configs are recorded in the store.
+def read_configs(store: SnapshotStore, networks: list, read, max_workers: int = 8):
+    stale = []
+    for network in networks:
+        snapshot = store.fresh(network['id'])
+        if snapshot is None:
+            stale.append(network)
+        else:
+            yield network, snapshot['config']
+    print(f"{len(networks) - len(stale)} configs taken from snapshots, reading {len(stale)} from the Dashboard..")
+
+    # If the consumer stops early (e.g. on an error), reads that have not started are dropped
+    # instead of being waited for.
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        readers = {executor.submit(read, network): network for network in stale}
+        for reader in as_completed(readers):
+            network = readers[reader]
+            config = reader.result()
+            if config is None:
+                continue
+            store.seen(network['id'], config)
+            yield network, config
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    return None
+
+
+# Print the planned change of a network as a unified diff.
+def print_diff(store: SnapshotStore, network: dict, current, planned):
+    header = network['name']
+    if store.drifted(network['id']):
+        header += " (changed since it was last applied)"
+    print(header)
+    diff = difflib.unified_diff(
+        json.dumps(current, indent=2, sort_keys=True).splitlines(),
+        json.dumps(planned, indent=2, sort_keys=True).splitlines(),
+        'current', 'planned', lineterm='', n=2
+        )
+    for line in list(diff)[2:]:
+        print(f"  {line}")
+
+    return None
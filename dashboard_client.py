@@ -0,0 +1,96 @@
+import inspect
+import threading
+
+import meraki
+import meraki.aio
+
+try:
+    import httpx
+except ImportError:     # SDK versions before 2.x are built on requests and keep their own pool
+    httpx = None
+
+# Shared transport for the Dashboard API clients of the scripts.
+# One client per API key and address is created per process and shared by every thread
+# (the SDK's HTTP client is thread safe), so connections and their TLS sessions are set up
+# once and kept alive between calls instead of per worker or per run. The pool is sized
+# for the scripts' worker counts and responses are requested gzip compressed.
+#
+# The SDK's own retries and per-organization throttling are turned off: every call goes
+# through rate_limiter.RateLimiter.call, which paces each organization and retries 429s,
+# server errors and dropped connections with one backoff policy. Clients for paginated
+# listings (use_iterator_for_get_pages) turn the SDK's retries back on, so a failed page is
+# requested again on its own, and take a rate limiter token per page (RateLimiter.pages).
+
+POOL_SIZE = 16              # Connections kept per client, at least the largest MAX_WORKERS
+KEEPALIVE_EXPIRY = 60       # Seconds an idle connection is kept open
+COMPRESSION = True          # Ask for gzip compressed responses
+REQUEST_TIMEOUT = 60        # Seconds before a single request is given up
+
+# Dashboard client settings; options an older SDK does not know are left out.
+SDK_OPTIONS = {
+    'wait_on_rate_limit': False,    # 429s are retried by the rate limiter
+    'maximum_retries': 1,           # One attempt per call, retries are the rate limiter's
+    'smart_flow_enabled': False,    # The rate limiter already paces every organization
+    'single_request_timeout': REQUEST_TIMEOUT
+    }
+
+clients = {}
+clients_lock = threading.Lock()
+
+
+def supported_options(api_class, options: dict):
+    parameters = inspect.signature(api_class.__init__).parameters
+
+    return {name: value for name, value in options.items() if name in parameters}
+
+
+def transport_limits(pool_size: int):
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+# Replace the HTTP client the SDK session created with one that has the pool settings above.
+def configure_transport(api, client_class, pool_size: int = POOL_SIZE):
+    session = getattr(api, '_session', None)
+    client = getattr(session, '_client', None)
+    if httpx is None or not isinstance(client, (httpx.Client, httpx.AsyncClient)):
+        return None
+
+    headers = dict(client.headers)
+    headers['Accept-Encoding'] = 'gzip' if COMPRESSION else 'identity'
+    client_kwargs = {'timeout': client.timeout, 'headers': headers, 'limits': transport_limits(pool_size)}
+    if getattr(session, '_certificate_path', None):
+        client_kwargs['verify'] = session._certificate_path
+    if getattr(session, '_requests_proxy', None):
+        client_kwargs['proxy'] = session._requests_proxy
+    if isinstance(client, httpx.Client):
+        client.close()
+    session._client = client_class(**client_kwargs)
+
+    return None
+
+
+# The shared client for an API key and address. Extra options (e.g. use_iterator_for_get_pages)
+# give a client of their own, which is shared in the same way.
+def get_dashboard(api_key: str, base_url: str, **options):
+    key = (api_key, base_url, tuple(sorted(options.items())))
+    with clients_lock:
+        dashboard = clients.get(key)
+        if dashboard is None:
+            settings = supported_options(meraki.DashboardAPI, dict(SDK_OPTIONS, **options))
+            dashboard = meraki.DashboardAPI(api_key, base_url=base_url, **settings)
+            configure_transport(dashboard, httpx.Client if httpx else None)
+            clients[key] = dashboard
+
+    return dashboard
+
+
+# An asyncio client with the same settings. It belongs to the running event loop, so every
+# asyncio.run gets its own; use it with `async with`.
+def async_dashboard(api_key: str, base_url: str, max_workers: int, **options):
+    settings = dict(SDK_OPTIONS, maximum_concurrent_requests=max_workers, **options)
+    aiodashboard = meraki.aio.AsyncDashboardAPI(api_key, base_url=base_url,
+                                                **supported_options(meraki.aio.AsyncDashboardAPI, settings))
+    configure_transport(aiodashboard, httpx.AsyncClient if httpx else None, max(POOL_SIZE, max_workers))
+
+    return aiodashboard
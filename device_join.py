@@ -0,0 +1,97 @@
+from export_schema import CLIENT_COLUMNS, DEVICE_COLUMNS, JOINED_DEVICE_FIELDS
+
+# Combined export of clients with the device they were last connected to.
+# Device rows are put in a hash index by serial and mac as they are written, and client rows
+# carry the JOIN_COLUMNS after the client columns; each client row is looked up as it is
+# written and goes to the clients file without them and to the combined file with the device.
+# Both sides are read once, and the index holds one short row per device, however many clients
+# there are. The devices of a network are always written before its clients.
+
+JOIN_CHUNK_ROWS = 1000      # Client rows joined and written at a time
+
+CLIENT_WIDTH = len(CLIENT_COLUMNS)
+DEVICE_FIELDS = [field for field, header, kind in DEVICE_COLUMNS]
+SERIAL = DEVICE_FIELDS.index('serial')
+MAC = DEVICE_FIELDS.index('mac')
+JOINED = [DEVICE_FIELDS.index(field) for field in JOINED_DEVICE_FIELDS]
+NO_DEVICE = ('None',) * len(JOINED)
+
+
+class DeviceIndex:
+    def __init__(self):
+        self.devices = {}           # serial or lowercase mac -> joined device columns
+
+    def add(self, rows: list):
+        for row in rows:
+            device = tuple(row[i] for i in JOINED)
+            if row[SERIAL] != 'None':
+                self.devices[row[SERIAL]] = device
+            if row[MAC] != 'None':
+                self.devices[row[MAC].lower()] = device
+
+        return None
+
+    # Client row with the JOIN_COLUMNS (serial, mac, connection) plus the joined device columns.
+    def join(self, row: tuple):
+        device = self.devices.get(row[CLIENT_WIDTH])
+        if device is None and row[CLIENT_WIDTH + 1] != 'None':
+            device = self.devices.get(row[CLIENT_WIDTH + 1].lower())
+
+        return row + (device or NO_DEVICE)
+
+
+# Devices writer that adds every device row to the index before writing it.
+class IndexingWriter:
+    def __init__(self, writer, index: DeviceIndex):
+        self.writer = writer
+        self.index = index
+
+    def writerows(self, rows):
+        rows = list(rows)
+        self.index.add(rows)
+        self.writer.writerows(rows)
+
+        return None
+
+    def offset(self):
+        return self.writer.offset()
+
+    def close(self):
+        self.writer.close()
+
+        return None
+
+
+# Clients writer that writes the client columns to the clients file and the joined rows to the
+# combined file, a chunk at a time so streamed clients are never all in memory.
+class JoiningWriter:
+    def __init__(self, writer, combined_writer, index: DeviceIndex):
+        self.writer = writer
+        self.combined_writer = combined_writer
+        self.index = index
+
+    def writerows(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= JOIN_CHUNK_ROWS:
+                self.write_chunk(chunk)
+                chunk = []
+        self.write_chunk(chunk)
+
+        return None
+
+    def write_chunk(self, chunk: list):
+        self.writer.writerows([row[:CLIENT_WIDTH] for row in chunk])
+        self.combined_writer.writerows([self.index.join(row) for row in chunk])
+
+        return None
+
+    def offset(self):
+        return self.writer.offset()
+
+    def close(self):
+        self.writer.close()
+        self.combined_writer.close()
+
+        return None
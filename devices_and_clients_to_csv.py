@@ -1,13 +1,86 @@
 import meraki 
+from meraki.config import DEFAULT_BASE_URL
+import asyncio
+import os
+import sys
 import time
-import csv
+from rate_limiter import MAX_RETRIES, RateLimiter
+from dashboard_client import async_dashboard, get_dashboard
+from network_index import get_network_index
+from incremental_export import ClientWatermarks, MAX_CLIENT_TIMESPAN, begin_incremental, merge_incremental
+from export_schema import DEVICE_COLUMNS, CLIENT_COLUMNS, COMBINED_COLUMNS, JOIN_COLUMNS, compile_row
+from export_writers import WRITE_BUFFER, open_writer
+from metrics import metrics
+from run_journal import RunJournal, journal_path
+from prefetch import background
+from client_counts import ClientCounts
+from device_join import DeviceIndex, IndexingWriter, JoiningWriter
+from writer_stage import WriterStage
 
 # This script interacts with the Meraki Dashboard API to fetch network, client and device data.
-# Exports the information to CSV files.
-
-API_KEY = input("Input your API Key from the Meraki Dashboard:")
-org_id = X
-dashboard = meraki.DashboardAPI(API_KEY)
+# Exports the information to CSV files, or to Parquet / Arrow files for analytics.
+
+API_KEY = None
+org_id = None               # Replace with your organization ID
+dashboard = None            # Created by connect()
+limiter = RateLimiter()
+
+BASE_URL = DEFAULT_BASE_URL # Dashboard API address, e.g. the local simulator in benchmarks/
+EXPORT_MODE = 'async'       # 'sync' = one network at a time, 'async' = many networks at once,
+                            # 'stream' = client pages written straight to the CSV as they arrive
+MAX_WORKERS = 8             # Maximum number of concurrent API calls in async mode
+BULK_DEVICES = True         # Fetch devices and appliance WAN IPs with organization-wide listings, not per network
+CLIENTS_PER_PAGE = 1000     # Smallest page of the client listing, busy networks get up to 5000 per page
+INVENTORY_PER_PAGE = 1000   # Page size of the organization-wide device and uplink listings
+NETWORK_CACHE_TTL = 3600    # Seconds the cached network list is reused, 0 = always fetch
+INCREMENTAL_CLIENTS = False # Only fetch clients seen since the last run and merge them into the clients CSV
+OUTPUT_FORMAT = 'csv'       # 'csv', 'parquet' or 'arrow' (the columnar formats need pyarrow installed)
+COMPRESSION = None          # Compress the CSV files as they are written: None, 'gzip' or 'zstd' (needs zstandard)
+WRITE_BUFFER_SIZE = WRITE_BUFFER    # Bytes of CSV buffered before it is compressed and written to disk
+BACKGROUND_WRITES = True    # Write the files on a background thread, so fetching does not wait on the disk
+DEVICES_FILE = 'mehi_devices'   # Output file names without extension
+CLIENTS_FILE = 'mehi_clients'
+COMBINED_FILE = None        # Also write the clients joined to their last AP / switch / appliance here, None = off
+METRICS_FILE = 'mehi_metrics'   # Run metrics written to <name>.json and <name>.prom, None = off
+PROGRESS = False            # Print a live progress line while the export runs
+RESUME = False              # Continue the last interrupted CSV export from its journal (or run with --resume)
+PREFETCH = True             # Load the networks (and with BULK_DEVICES the devices) while the prompts are answered
+
+watermarks = None           # Loaded by exportData() in incremental mode
+journal = None              # Opened by exportData() for uncompressed CSV exports
+clientCounts = None         # Client counts of the last export, loaded by exportData()
+writerStage = None          # Background writer of the export files, started by exportData()
+failedNetworks = []         # Networks of the journaled export that could not be fetched
+prefetched = {}             # 'index' / 'devices' -> Future, started by prefetch()
+
+# Row tuples in export column order, built straight from the API records.
+# For the combined export client rows also carry the JOIN_COLUMNS, see device_join.
+deviceRow = compile_row(DEVICE_COLUMNS)
+clientRow = compile_row(CLIENT_COLUMNS, ('network',))
+clientJoinRow = compile_row(CLIENT_COLUMNS + JOIN_COLUMNS, ('network',))
+
+
+def connect(api_key: str):
+    global API_KEY, dashboard
+    API_KEY = api_key
+    dashboard = get_dashboard(api_key, BASE_URL)
+
+    return dashboard
+
+
+# Client for paginated listings: the pages come from an iterator, so the rate limiter takes a
+# token for each page. The SDK requests them out of reach of the rate limiter's retries, so this
+# client retries a failed page itself and waits out 429s.
+def pages_dashboard():
+    return get_dashboard(API_KEY, BASE_URL, suppress_logging=True, use_iterator_for_get_pages=True,
+                         maximum_retries=MAX_RETRIES, wait_on_rate_limit=True)
+
+
+# Every item of a paginated listing, e.g. list_pages(pages_dashboard().networks.getNetworkClients, 1000, network_id).
+def list_pages(func, per_page: int, *args, **kwargs):
+    items = func(*args, perPage=per_page, total_pages='all', **kwargs)
+
+    return list(limiter.pages(items, per_page, func.__name__))
 
 
 def searchNetworks():
@@ -22,148 +95,484 @@ def searchNetworks():
     return list(search_keywords), list(filter_keywords), list(tags_keywords)
 
 
+# Start loading the network index and the device inventory in the background.
+def prefetch():
+    if not PREFETCH:
+        return None
+    prefetched['index'] = background(get_network_index, dashboard, limiter, org_id, NETWORK_CACHE_TTL)
+    if BULK_DEVICES:
+        prefetched['devices'] = background(list_pages, pages_dashboard().organizations.getOrganizationDevices,
+                                           INVENTORY_PER_PAGE, org_id)
+        prefetched['uplinks'] = background(list_pages, pages_dashboard().appliance.getOrganizationApplianceUplinkStatuses,
+                                           INVENTORY_PER_PAGE, org_id)
+
+    return None
+
+
 def filterNetworks(org_id: int, search_keywords: list, filter_keywords: list, tags_keywords):
-    network_results = []
+    if 'index' in prefetched:
+        index = prefetched.pop('index').result()
+    else:
+        index = get_network_index(dashboard, limiter, org_id, NETWORK_CACHE_TTL)
+
+    return index.search(search_keywords, filter_keywords, tags_keywords)
+
+
+def print_networks(networks: list):
+    for network in networks:
+        print (network['name'])
+        metrics.pause(0.001, 'display')
+
+    return None
+
+
+# With BACKGROUND_WRITES the rows are only queued here and counted once the stage writes them.
+def Datatowriter(writer, dataList: list):
+    started = time.perf_counter()
+    writer.writerows(dataList)
+    if writerStage is None:
+        metrics.wrote(len(dataList), time.perf_counter() - started)
+
+    return None
+
+
+# None when the devices could not be fetched.
+def get_devices(network_id: str):
+    try:
+        devices = limiter.call(dashboard.networks.getNetworkDevices, network_id)
+    except meraki.APIError as e:
+        print(f"Error {e}")
+        return None
+
+    return buildDevicesList(devices)
+
+
+# Fetch every device of the organization with one paginated listing, or take the prefetched
+# one, and group them by network, keeping only the selected networks.
+# None when the devices or their WAN addresses could not be fetched.
+def get_org_devices(org_id: int, networks: list):
+    try:
+        if 'devices' in prefetched:
+            devices = prefetched.pop('devices').result()
+        else:
+            devices = list_pages(pages_dashboard().organizations.getOrganizationDevices, INVENTORY_PER_PAGE, org_id)
+    except meraki.APIError as e:
+        print(f"Error {e}")
+        devices = None
+    uplinks = get_org_uplinks(org_id)
+    if devices is None or uplinks is None:
+        return None
+
+    return groupDevicesByNetwork(addWanIps(devices, uplinks), networks)
+
+
+# The organization-wide device listing has no WAN addresses, the appliance uplink statuses do.
+# None when they could not be fetched.
+def get_org_uplinks(org_id: int):
+    try:
+        if 'uplinks' in prefetched:
+            return prefetched.pop('uplinks').result()
+        return list_pages(pages_dashboard().appliance.getOrganizationApplianceUplinkStatuses, INVENTORY_PER_PAGE, org_id)
+    except meraki.APIError as e:
+        print(f"Error {e}")
+        return None
+
+
+# Fill wan1Ip / wan2Ip of the appliances from their uplink statuses, as getNetworkDevices has them.
+def addWanIps(devices: list, uplinkStatuses: list):
+    wanIps = {}
+    for status in uplinkStatuses:
+        wanIps[status.get('serial')] = {f"{uplink['interface']}Ip": uplink.get('ip')
+                                        for uplink in status.get('uplinks', [])
+                                        if uplink.get('interface') in ('wan1', 'wan2')}
+    for device in devices:
+        if device.get('serial') in wanIps:
+            device.update(wanIps[device['serial']])
+
+    return devices
+
+
+def groupDevicesByNetwork(devices: list, networks: list):
+    devicesByNetwork = {network['id']: [] for network in networks}
+    for device in devices:
+        network_devices = devicesByNetwork.get(device.get('networkId'))
+        if network_devices is not None:
+            network_devices.append(device)
 
-    org_networks = dashboard.organizations.getOrganizationNetworks(org_id)
+    return dict(devicesByNetwork)
 
-    filter_keywords_set = set(filter_keywords)
-    tags_keywords_set = set(tags_keywords)
 
-    for network in org_networks:
-        network_name = network['name'].lower()
-        network_tags = set(tag.lower() for tag in network.get('tags', []))
+# Map the API device fields to the export columns.
+def buildDevicesList(devices: list):
+    return [deviceRow(device) for device in devices]
 
-        name_matches = all(keyword in network_name for keyword in search_keywords)
-        name_excludes = not any(filter_word in network_name for filter_word in filter_keywords_set)
-        tags_match = tags_keywords_set.issubset(network_tags)
 
-        if name_matches and name_excludes and (not tags_keywords or tags_match):
-            network_results.append(network) 
-    
-    networks = sorted(network_results, key=lambda x: x['name'])
+# The device rows of a network from the organization's inventory, None for every network
+# when the inventory could not be fetched.
+def inventoryDevicesList(devicesByNetwork: dict, network_id: str):
+    if devicesByNetwork is None:
+        return None
+
+    return buildDevicesList(devicesByNetwork[network_id])
+
+
+# None when the clients could not be fetched.
+def get_clients(network_id: str, network_name: str):
+    try:
+        clients = list_pages(pages_dashboard().networks.getNetworkClients, clientsPerPage(network_id), network_id,
+                             timespan=client_timespan(network_id))
+    except meraki.APIError as e:
+        print(f"Error {e}")
+        return None
+    recordClients(network_id, len(clients))
 
-    return list(networks)
+    return buildClientsList(clients, network_name)
 
 
-def print_networks(networks: dict):
-    for id in networks:
-        print (networks[id])
-        time.sleep(0.001)
+# Window of client history to fetch: since the network's watermark in incremental mode, else 31 days.
+def client_timespan(network_id: str):
+    if INCREMENTAL_CLIENTS:
+        return watermarks.timespan(network_id)
+
+    return MAX_CLIENT_TIMESPAN
+
+
+def mark_clients_fetched(network_id: str, fetched_at: float):
+    if INCREMENTAL_CLIENTS:
+        watermarks.mark(network_id, fetched_at)
 
     return None
 
 
-def CreateFileHeaders(file_name: str, headers: list):
-    with open(file_name, 'w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.writer(csv_file, delimiter=';')
-        writer.writerow(headers)
+# Page size of a network's client listing, sized to the clients it had last time.
+def clientsPerPage(network_id: str):
+    if clientCounts is None:
+        return CLIENTS_PER_PAGE
+
+    return clientCounts.per_page(network_id, CLIENTS_PER_PAGE)
+
+
+def recordClients(network_id: str, count: int):
+    if clientCounts is not None:
+        clientCounts.record(network_id, count)
 
     return None
 
-    
-def Datatocsv(file_name: str, dataList: list):
-    with open(file_name, 'a', newline='', encoding='utf-8') as csv_file:
-        writer = csv.writer(csv_file, delimiter=';')
-        for Info in dataList:
-            writer.writerow(Info.values())
+
+# Map the API client fields to the export columns.
+def buildClientsList(clients: list, network_name: str):
+    row = clientJoinRow if COMBINED_FILE else clientRow
+
+    return [row(client, network_name) for client in clients]
+
+
+# Yield the clients of a network one at a time while the SDK pages through the listing.
+# Every client yielded is written by the caller.
+def stream_clients(stream_dashboard, network_id: str):
+    per_page = clientsPerPage(network_id)
+    clients = stream_dashboard.networks.getNetworkClients(
+        network_id,
+        timespan=client_timespan(network_id),
+        perPage=per_page,
+        total_pages='all'
+        )
+    count = 0
+    try:
+        for client in limiter.pages(clients, per_page, 'getNetworkClients'):
+            count += 1
+            yield client
+        recordClients(network_id, count)
+    finally:
+        if writerStage is None:     # The stage counts the rows it writes itself
+            metrics.wrote(count)
 
     return None
 
 
-def get_devices(network_id: str):
-    devicesList = []
-    retry = True
-    while retry:
+# Pass client pages straight through to the writer, so memory stays
+# constant no matter how many clients a network has.
+def exportNetworksStreaming(networks: list, devices_writer, clients_writer):
+    stream_dashboard = pages_dashboard()
+    row = clientJoinRow if COMBINED_FILE else clientRow
+    if BULK_DEVICES:
+        devicesByNetwork = get_org_devices(org_id, networks)
+
+    for network in networks:
+        if BULK_DEVICES:
+            devicesList = inventoryDevicesList(devicesByNetwork, network['id'])
+        else:
+            devicesList = get_devices(network['id'])
+        Datatowriter(devices_writer, devicesList or [])
+        fetched_at = time.time()
+        fetched = devicesList is not None
         try:
-            devices = dashboard.networks.getNetworkDevices(network_id)
-            time.sleep(0.2)
-            retry = False
+            clients_writer.writerows(row(client, network['name'])
+                                     for client in stream_clients(stream_dashboard, network['id']))
         except meraki.APIError as e:
-            if e.status == 429:
-                print("Rate limit exceeded, retrying in 5 seconds...")
-                time.sleep(5)
-            else:        
-                print(f"Error {e}")
-                retry = False
-    print(devices)
-    for device in devices:
-        devicesDict = {
-        'name': 'None',
-        'model': 'None',
-        'serial': 'None',
-        'firmware': 'None',
-        'mac': 'None',
-        'lanIp': 'None',
-        'wan1Ip': 'None',
-        'wan2Ip': 'None'
-        } 
-        for i in device:
-            if i in devicesDict:
-                devicesDict[i] = device[i]
-        devicesList.append(devicesDict)
-
-    return list(devicesList)
+            print(f"Error {e}")
+            print(f"Error in {network['name']}")
+            fetched = False
+        networkWritten(network, devices_writer, clients_writer, fetched, fetched_at)
 
+    return None
 
-def get_clients(network_id: str, network_name: str):
-    clientsList = []
-    retry = True
-    while retry:
+
+# Fetch one network at a time.
+def exportNetworks(networks: list, devices_writer, clients_writer):
+    if BULK_DEVICES:
+        devicesByNetwork = get_org_devices(org_id, networks)
+    for network in networks:
+        if BULK_DEVICES:
+            devicesList = inventoryDevicesList(devicesByNetwork, network['id'])
+        else:
+            devicesList = get_devices(network['id'])
+        Datatowriter(devices_writer, devicesList or [])
+        fetched_at = time.time()
+        clientsList = get_clients(network['id'], network['name'])
+        Datatowriter(clients_writer, clientsList or [])
+        networkWritten(network, devices_writer, clients_writer, devicesList is not None and clientsList is not None,
+                       fetched_at)
+
+    return None
+
+
+# Fetch one API resource for a network, returning None on errors.
+# 429 responses are handled by the shared rate limiter.
+async def fetch_async(semaphore: asyncio.Semaphore, network_name: str, call, *args, **kwargs):
+    async with semaphore:
         try:
-            clients = dashboard.networks.getNetworkClients(network_id, timespan=2678400, total_pages='all')
-            time.sleep(0.2)
-            retry = False
+            return await limiter.call_async(call, *args, **kwargs)
         except meraki.APIError as e:
-            if e.status == 429:
-                print("Rate limit exceeded, retrying in 5 seconds...")
-                time.sleep(5)
-            else:        
-                print(f"Error {e}")
-                retry = False
-
-    for client in clients:
-        clientsDict = {
-            'network': network_name,
-            'id': 'None',
-            'description': 'None',
-            'mac': 'None',
-            'ip': 'None',
-            'ip6': 'None',
-            'user': 'None',
-            'firstSeen': 'None',
-            'lastSeen': 'None',
-            'os': 'None',
-            'ssid': 'None'
-        }
-        for i in client:
-            if i in clientsDict:
-                clientsDict[i] = client[i]
-        clientsList.append(clientsDict)
-
-    return list(clientsList)
+            print(f"Error {e}")
+            print(f"Error in {network_name}")
+            return None
+
+
+# Fetch every item of a paginated listing with list_pages on a worker thread, returning None on
+# errors. The asyncio client's iterator requests each next page before the rate limiter could
+# pace it, so listings page with the blocking client, one token per page.
+async def fetch_pages_async(semaphore: asyncio.Semaphore, network_name: str, func, per_page: int, *args, **kwargs):
+    async with semaphore:
+        try:
+            return await asyncio.to_thread(list_pages, func, per_page, *args, **kwargs)
+        except meraki.APIError as e:
+            print(f"Error {e}")
+            print(f"Error in {network_name}")
+            return None
+
+
+# Devices are fetched per network only when no organization-wide inventory was given.
+# Returns the device rows, the client rows and when the listings were started, None unless both were fetched.
+async def get_network_data_async(aiodashboard, semaphore: asyncio.Semaphore, network: dict, devicesByNetwork=None):
+    fetched_at = time.time()
+    clients_call = fetch_pages_async(semaphore, network['name'], pages_dashboard().networks.getNetworkClients,
+                                     clientsPerPage(network['id']), network['id'],
+                                     timespan=client_timespan(network['id']))
+    if devicesByNetwork is None:
+        devices, clients = await asyncio.gather(
+            fetch_async(semaphore, network['name'], aiodashboard.networks.getNetworkDevices, network['id']),
+            clients_call
+            )
+    else:
+        devices = devicesByNetwork[network['id']]
+        clients = await clients_call
+    if clients is not None:
+        recordClients(network['id'], len(clients))
+    if devices is None or clients is None:
+        fetched_at = None
+
+    return buildDevicesList(devices or []), buildClientsList(clients or [], network['name']), fetched_at
+
+
+# Fetch devices and clients for many networks at once with a bounded worker pool.
+# The busiest networks are started first, so their long client listings overlap with
+# the rest; results are still written in network order as soon as each network is done.
+# max_workers defaults to MAX_WORKERS as set when the export runs, e.g. by a batch job's options.
+async def exportNetworksAsync(networks: list, devices_writer, clients_writer, max_workers: int = None):
+    max_workers = max_workers or MAX_WORKERS
+    semaphore = asyncio.Semaphore(max_workers)
+    async with async_dashboard(API_KEY, BASE_URL, max_workers, suppress_logging=True) as aiodashboard:
+        devicesByNetwork = None
+        if BULK_DEVICES and 'devices' in prefetched:
+            devicesByNetwork = get_org_devices(org_id, networks)
+        elif BULK_DEVICES:
+            devices, uplinks = await asyncio.gather(
+                fetch_pages_async(semaphore, 'organization', pages_dashboard().organizations.getOrganizationDevices,
+                                  INVENTORY_PER_PAGE, org_id),
+                fetch_pages_async(semaphore, 'organization', pages_dashboard().appliance.getOrganizationApplianceUplinkStatuses,
+                                  INVENTORY_PER_PAGE, org_id)
+                )
+            if devices is not None and uplinks is not None:
+                devicesByNetwork = groupDevicesByNetwork(addWanIps(devices, uplinks), networks)
+        if BULK_DEVICES and devicesByNetwork is None:
+            # The inventory could not be fetched, so no network's devices are complete.
+            devicesByNetwork = dict.fromkeys(network['id'] for network in networks)
+
+        tasks = {network['id']: asyncio.create_task(get_network_data_async(aiodashboard, semaphore, network,
+                                                                           devicesByNetwork))
+                 for network in busiestFirst(networks)}
+        for network in networks:
+            devicesList, clientsList, fetched_at = await tasks[network['id']]
+            Datatowriter(devices_writer, devicesList)
+            Datatowriter(clients_writer, clientsList)
+            networkWritten(network, devices_writer, clients_writer, fetched_at is not None, fetched_at)
+
+    return None
+
+
+def busiestFirst(networks: list):
+    if clientCounts is None:
+        return list(networks)
+
+    return clientCounts.busiest_first(networks)
+
+
+# Record in the journal that every row of the network is in the files, and only then move its
+# client watermark to fetched_at. A network that was not fetched completely is cut back out of
+# the files instead and left for --resume (or the next incremental run) to fetch again.
+# With the background writer this happens once the stage has written the rows queued before it.
+def networkWritten(network: dict, devices_writer, clients_writer, fetched: bool = True, fetched_at: float = None):
+    if journal is None:
+        if fetched:
+            mark_clients_fetched(network['id'], fetched_at)
+        return None
+    if not fetched:
+        failedNetworks.append(network['id'])
+
+    def record():
+        if fetched:
+            journal.mark_done(network['id'], offsets=[devices_writer.offset(), clients_writer.offset()])
+            mark_clients_fetched(network['id'], fetched_at)
+        else:
+            devices_writer.truncate(journal.offsets[0])
+            clients_writer.truncate(journal.offsets[1])
+        return None
+
+    if writerStage is None:
+        record()
+    else:
+        writerStage.after(record)
+
+    return None
+
+
+# Open the export journal. When resuming, returns the networks that are still missing and
+# the file sizes to cut the CSV files back to; otherwise all networks and no offsets.
+def openJournal(networks: list, resume: bool):
+    global journal
+    files = [f"{DEVICES_FILE}.csv", f"{CLIENTS_FILE}.csv"]
+    header = {'files': [os.path.abspath(file_name) for file_name in files], 'incremental': INCREMENTAL_CLIENTS}
+    journal = RunJournal(journal_path(org_id, 'export', header))
+    if journal.open(header, resume) and journal.offsets is not None:
+        if all(os.path.exists(file_name) and os.path.getsize(file_name) >= offset
+               for file_name, offset in zip(files, journal.offsets)):
+            print(f"Resuming the export, {len(journal.done)} networks were already written.")
+            return [network for network in networks if not journal.is_done(network['id'])], journal.offsets
+        print("The export files do not match the journal, starting from the beginning.")
+        journal.close()
+        journal.open(header, False)
+
+    return list(networks), [None, None]
+
+
+# Export the devices and clients of the networks to DEVICES_FILE and CLIENTS_FILE.
+# Uncompressed CSV exports without COMBINED_FILE keep a journal, so an interrupted export, or one
+# where networks could not be fetched, can be continued with RESUME.
+def exportData(networks: list):
+    global watermarks, journal, clientCounts, writerStage
+    if INCREMENTAL_CLIENTS and (OUTPUT_FORMAT != 'csv' or COMPRESSION):
+        raise ValueError("Incremental client export only works with OUTPUT_FORMAT = 'csv' and no COMPRESSION.")
+    resume = RESUME
+    if resume and (OUTPUT_FORMAT != 'csv' or COMPRESSION or COMBINED_FILE):
+        print("Only uncompressed CSV exports without COMBINED_FILE can be resumed, starting from the beginning.")
+        resume = False
+
+    offsets = [None, None]
+    failedNetworks.clear()
+    if OUTPUT_FORMAT == 'csv' and not COMPRESSION and not COMBINED_FILE:
+        networks, offsets = openJournal(networks, resume)
+    if INCREMENTAL_CLIENTS:
+        watermarks = ClientWatermarks(f"{CLIENTS_FILE}.watermarks.json")
+        begin_incremental(f"{CLIENTS_FILE}.csv")
+    clientCounts = ClientCounts(org_id)
+    devices_writer = open_writer(DEVICES_FILE, DEVICE_COLUMNS, OUTPUT_FORMAT, offsets[0], COMPRESSION, WRITE_BUFFER_SIZE)
+    clients_writer = open_writer(CLIENTS_FILE, CLIENT_COLUMNS, OUTPUT_FORMAT, offsets[1], COMPRESSION, WRITE_BUFFER_SIZE)
+    if COMBINED_FILE:
+        index = DeviceIndex()
+        devices_writer = IndexingWriter(devices_writer, index)
+        clients_writer = JoiningWriter(clients_writer, open_writer(COMBINED_FILE, COMBINED_COLUMNS, OUTPUT_FORMAT,
+                                                                   None, COMPRESSION, WRITE_BUFFER_SIZE), index)
+    if journal is not None and journal.offsets is None:
+        journal.offsets = [devices_writer.offset(), clients_writer.offset()]
+    if BACKGROUND_WRITES:
+        writerStage = WriterStage()
+        devices_writer = writerStage.writer(devices_writer)
+        clients_writer = writerStage.writer(clients_writer)
+    finished = False
+    try:
+        if EXPORT_MODE == 'async':
+            asyncio.run(exportNetworksAsync(networks, devices_writer, clients_writer, MAX_WORKERS))
+        elif EXPORT_MODE == 'stream':
+            exportNetworksStreaming(networks, devices_writer, clients_writer)
+        else:
+            exportNetworks(networks, devices_writer, clients_writer)
+        if writerStage is not None:
+            writerStage.close()
+        finished = True
+    finally:
+        if writerStage is not None:
+            writerStage.stop()
+            writerStage = None
+        devices_writer.close()
+        clients_writer.close()
+        if journal is not None:
+            # Incremental exports fetch failed networks again on the next run, their watermarks did not move.
+            retry = bool(failedNetworks) and not INCREMENTAL_CLIENTS
+            journal.close(finished and not retry)
+            journal = None
+            if finished and retry:
+                print(f"{len(failedNetworks)} networks could not be fetched and were left out, "
+                      f"run again with --resume to fetch them.")
+        clientCounts.save()
+    if INCREMENTAL_CLIENTS:
+        # Network name and client id identify a row, network name and mac when the id is missing.
+        merge_incremental(f"{CLIENTS_FILE}.csv", (0, 1), (0, 3))
+        watermarks.save()
+
+    return None
+
+
+def saveMetrics():
+    if METRICS_FILE:
+        metrics.write(METRICS_FILE, {'script': 'devices_and_clients_to_csv', 'org': org_id})
+
+    return None
 
 
 def main():
-    HeadersDevices = ["Name", "Model", "Serial", "Firmware", "Mac", "LanIP", "Wan1IP", "Wan2IP"]
-    HeadersClients = ["Network", "ID", "Description", "Mac", "IPv4", "IPv6", "User", "First Seen", "Last Seen", "Os", "SSID"]
+    if INCREMENTAL_CLIENTS and OUTPUT_FORMAT != 'csv':
+        print("Incremental client export only works with OUTPUT_FORMAT = 'csv'.")
+        return None
+
+    metrics.reset()
+    prefetch()
 
     Search, Filter, Tags = searchNetworks()
     networks = filterNetworks(org_id, Search, Filter, Tags)
     print("Getting data from the following networks..\n")
-    time.sleep(1)
+    metrics.pause(1, 'display')
     print_networks(networks)
     Valinta = input("Do you wish to continue?(Y/N)").lower()
 
     if Valinta == 'y':
-        print("Importing Meraki data to a csv file.")
-        CreateFileHeaders('mehi_devices.csv', HeadersDevices)
-        CreateFileHeaders('mehi_clients.csv', HeadersClients)
-        for network_id, network_name in networks.items():
-            devicesList = get_devices(network_id)
-            Datatocsv('mehi_devices.csv', devicesList)
-            clientsList = get_clients(network_id, network_name)
-            Datatocsv('mehi_clients.csv', clientsList)
+        print(f"Importing Meraki data to {OUTPUT_FORMAT} files.")
+        if PROGRESS:
+            metrics.start_progress()
+        try:
+            exportData(networks)
+        finally:
+            metrics.stop_progress()
+        saveMetrics()
     elif Valinta == 'n':
         print("The program will close now.")
 
@@ -171,4 +580,7 @@ def main():
 
 
 if __name__ == "__main__":
+    if '--resume' in sys.argv[1:]:
+        RESUME = True
+    connect(input("Input your API Key from the Meraki Dashboard:"))
     main()
@@ -0,0 +1,69 @@
+# Columns of the device and client exports.
+# Each column is (API field, CSV header, column type). The type is used by the columnar
+# output formats: 'string', 'dictionary' for values repeated across many rows, or 'timestamp'.
+
+DEVICE_COLUMNS = [
+    ('name', 'Name', 'string'),
+    ('model', 'Model', 'dictionary'),
+    ('serial', 'Serial', 'string'),
+    ('firmware', 'Firmware', 'dictionary'),
+    ('mac', 'Mac', 'string'),
+    ('lanIp', 'LanIP', 'string'),
+    ('wan1Ip', 'Wan1IP', 'string'),
+    ('wan2Ip', 'Wan2IP', 'string')
+    ]
+
+CLIENT_COLUMNS = [
+    ('network', 'Network', 'dictionary'),
+    ('id', 'ID', 'string'),
+    ('description', 'Description', 'string'),
+    ('mac', 'Mac', 'string'),
+    ('ip', 'IPv4', 'string'),
+    ('ip6', 'IPv6', 'string'),
+    ('user', 'User', 'string'),
+    ('firstSeen', 'First Seen', 'timestamp'),
+    ('lastSeen', 'Last Seen', 'timestamp'),
+    ('os', 'Os', 'dictionary'),
+    ('ssid', 'SSID', 'dictionary')
+    ]
+
+# The device a client was last connected to, read from the client record for the combined export.
+JOIN_COLUMNS = [
+    ('recentDeviceSerial', 'Device Serial', 'string'),
+    ('recentDeviceMac', 'Device Mac', 'string'),
+    ('recentDeviceConnection', 'Connection', 'dictionary')
+    ]
+
+# Device columns the combined export takes from the device itself, the keys come from the client.
+JOINED_DEVICE_FIELDS = ['name', 'model', 'firmware', 'lanIp', 'wan1Ip', 'wan2Ip']
+
+# Clients with the device (AP, switch or appliance) they were last connected to.
+COMBINED_COLUMNS = CLIENT_COLUMNS + JOIN_COLUMNS + [
+    (f"device{field[0].upper()}{field[1:]}", f"Device {header}", kind)
+    for field, header, kind in DEVICE_COLUMNS if field in JOINED_DEVICE_FIELDS
+    ]
+
+
+def headers(columns: list):
+    return [header for field, header, kind in columns]
+
+
+# Compile a function that extracts the columns of one API record into a row tuple, in column
+# order, with 'None' for missing fields. Fields named in `arguments` are not read from the
+# record but passed in after it, e.g. the network name of a client row:
+#   clientRow = compile_row(CLIENT_COLUMNS, ('network',))
+#   clientRow(client, network_name)
+def compile_row(columns: list, arguments: tuple = ()):
+    values = []
+    for field, header, kind in columns:
+        if field in arguments:
+            values.append(field)
+        else:
+            values.append(f"get({field!r}, 'None')")
+
+    parameters = ', '.join(('record',) + tuple(arguments))
+    source = f"def row({parameters}):\n    get = record.get\n    return ({', '.join(values)},)\n"
+    namespace = {}
+    exec(compile(source, f"<row {' '.join(field for field, header, kind in columns)}>", 'exec'), namespace)
+
+    return namespace['row']
@@ -0,0 +1,211 @@
+import csv
+import gzip
+import io
+import os
+from datetime import datetime, timezone
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:     # Only needed for the parquet and arrow output formats
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:     # Only needed for zstd compressed CSV
+    zstandard = None
+
+from export_schema import headers
+
+# Writers for the device and client exports. Every writer is opened once per run and takes
+# rows (sequences in column order) through writerows, so the export code does not need to
+# know which format it is writing.
+#
+# Output formats:
+#   'csv'       semicolon separated text, missing values written as 'None'
+#   'parquet'   columnar with real nulls, dictionary encoded repeated strings and typed timestamps
+#   'arrow'     the same columns as an Arrow IPC stream (reload with pyarrow.ipc.open_stream)
+#
+# CSV can be compressed as it is written: 'gzip' (.csv.gz) or 'zstd' (.csv.zst, needs the
+# zstandard package). The columnar formats compress their pages themselves.
+
+EXTENSIONS = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrows'}
+COMPRESSIONS = {'gzip': 'gz', 'zstd': 'zst'}
+COLUMNAR_BATCH_ROWS = 65536     # Rows buffered before a columnar writer writes a record batch
+WRITE_BUFFER = 1048576      # Bytes of CSV text buffered before it is compressed and written
+GZIP_LEVEL = 6              # About 100k rows/s, more than the API delivers; level 1 is twice as fast, 20% larger
+ZSTD_LEVEL = 3
+
+
+# With an offset the file is cut back to that size and appended to, to resume an export.
+# Compressed files can not be cut back, so they are always written from the start.
+class CsvWriter:
+    def __init__(self, file_name: str, columns: list, delimiter: str = ';', offset: int = None,
+                 compression: str = None, buffer_size: int = WRITE_BUFFER):
+        self.raw = None
+        if compression is not None:
+            if offset is not None:
+                raise ValueError("Compressed CSV files can not be appended to.")
+            self.raw = open(file_name, 'wb')
+            self.file = io.TextIOWrapper(io.BufferedWriter(compressed_stream(self.raw, compression), buffer_size),
+                                         encoding='utf-8', newline='')
+            self.writer = csv.writer(self.file, delimiter=delimiter)
+            self.writer.writerow(headers(columns))
+        elif offset is None:
+            self.file = open(file_name, 'w', newline='', encoding='utf-8', buffering=buffer_size)
+            self.writer = csv.writer(self.file, delimiter=delimiter)
+            self.writer.writerow(headers(columns))
+        else:
+            os.truncate(file_name, offset)
+            self.file = open(file_name, 'a', newline='', encoding='utf-8', buffering=buffer_size)
+            self.writer = csv.writer(self.file, delimiter=delimiter)
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+
+        return None
+
+    # Size of the file with everything written so far.
+    def offset(self):
+        self.file.flush()
+
+        return os.fstat(self.file.fileno()).st_size
+
+    # Cut the file back to an offset() taken earlier and go on writing from there.
+    def truncate(self, offset: int):
+        self.file.flush()
+        self.file.buffer.seek(offset)
+        self.file.buffer.truncate()
+
+        return None
+
+    def close(self):
+        self.file.close()
+        if self.raw is not None:
+            self.raw.close()
+
+        return None
+
+
+# Binary stream that compresses what is written to it into raw_file.
+def compressed_stream(raw_file, compression: str):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw_file, mode='wb', compresslevel=GZIP_LEVEL)
+    if zstandard is None:
+        raise ImportError("zstd compression needs zstandard (pip install zstandard).")
+
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw_file, closefd=False)
+
+
+def to_timestamp(value):
+    if value is None or value == 'None':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+
+
+def to_string(value):
+    if value is None or value == 'None':
+        return None
+
+    return value if isinstance(value, str) else str(value)
+
+
+class ColumnarWriter:
+    def __init__(self, file_name: str, columns: list, output_format: str = 'parquet',
+                 batch_rows: int = COLUMNAR_BATCH_ROWS):
+        if pyarrow is None:
+            raise ImportError("The parquet and arrow output formats need pyarrow (pip install pyarrow).")
+
+        self.kinds = [kind for field, header, kind in columns]
+        self.batch_rows = batch_rows
+        self.schema = pyarrow.schema([pyarrow.field(field, arrow_type(kind)) for field, header, kind in columns])
+        self.values = [[] for _ in columns]
+        self.buffered = 0
+
+        if output_format == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(file_name, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_stream(file_name, self.schema)
+
+    def writerows(self, rows):
+        values = self.values
+        for row in rows:
+            for column, value in zip(values, row):
+                column.append(value)
+            self.buffered += 1
+            if self.buffered >= self.batch_rows:
+                self.flush()
+
+        return None
+
+    def flush(self):
+        if not self.buffered:
+            return None
+
+        arrays = [to_array(column, kind) for column, kind in zip(self.values, self.kinds)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+        for column in self.values:
+            column.clear()
+        self.buffered = 0
+
+        return None
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+        return None
+
+
+def arrow_type(kind: str):
+    if kind == 'dictionary':
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    if kind == 'timestamp':
+        return pyarrow.timestamp('s', tz='UTC')
+
+    return pyarrow.string()
+
+
+def to_array(values: list, kind: str):
+    if kind == 'timestamp':
+        return pyarrow.array([to_timestamp(value) for value in values], type=arrow_type(kind))
+
+    strings = pyarrow.array([to_string(value) for value in values], type=pyarrow.string())
+    if kind == 'dictionary':
+        return strings.dictionary_encode()
+
+    return strings
+
+
+# File name of an export, e.g. mehi_clients.csv or mehi_clients.csv.gz.
+def output_name(base_name: str, output_format: str = 'csv', compression: str = None):
+    file_name = f"{base_name}.{EXTENSIONS[output_format]}"
+    if compression is not None:
+        file_name += f".{COMPRESSIONS[compression]}"
+
+    return file_name
+
+
+# Open the writer for an export. base_name is the file name without extension.
+def open_writer(base_name: str, columns: list, output_format: str = 'csv', offset: int = None,
+                compression: str = None, buffer_size: int = WRITE_BUFFER):
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}, use 'gzip' or 'zstd'.")
+    file_name = output_name(base_name, output_format, compression)
+    if output_format == 'csv':
+        return CsvWriter(file_name, columns, offset=offset, compression=compression, buffer_size=buffer_size)
+    if offset is not None:
+        raise ValueError(f"The {output_format} format can not be appended to.")
+    if compression is not None:
+        raise ValueError(f"The {output_format} format is compressed already, compression only applies to CSV.")
+
+    return ColumnarWriter(file_name, columns, output_format)
@@ -0,0 +1,95 @@
+import csv
+import json
+import os
+import time
+
+# Incremental client export.
+# A watermark per network records when its clients were last fetched successfully, so the
+# next run only asks for the window since then. The new rows are merged into the previous
+# export: a client seen again replaces its old row, every other old row is kept.
+
+MAX_CLIENT_TIMESPAN = 2678400   # 31 days, the longest window getNetworkClients accepts
+MIN_CLIENT_TIMESPAN = 300
+WATERMARK_OVERLAP = 900         # Seconds re-fetched before each watermark to cover late lastSeen updates
+
+
+class ClientWatermarks:
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as watermark_file:
+                self.watermarks = json.load(watermark_file)
+        except (OSError, ValueError):
+            self.watermarks = {}
+
+    # Window in seconds to request for a network, the full history if it has no watermark.
+    def timespan(self, network_id: str, now: float = None):
+        watermark = self.watermarks.get(network_id)
+        if watermark is None:
+            return MAX_CLIENT_TIMESPAN
+        now = time.time() if now is None else now
+        timespan = int(now - watermark) + WATERMARK_OVERLAP
+
+        return max(MIN_CLIENT_TIMESPAN, min(MAX_CLIENT_TIMESPAN, timespan))
+
+    def mark(self, network_id: str, fetched_at: float):
+        self.watermarks[network_id] = fetched_at
+
+        return None
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as watermark_file:
+            json.dump(self.watermarks, watermark_file)
+        os.replace(temp_path, self.path)
+
+        return None
+
+
+def previous_path(file_name: str):
+    return f"{file_name}.previous"
+
+
+# Move the last export aside so this run writes only new rows to file_name.
+# Returns False when there is no previous export to merge into. If an interrupted run
+# already moved it aside, file_name only holds that run's partial rows and is left alone.
+def begin_incremental(file_name: str):
+    if os.path.exists(previous_path(file_name)):
+        return True
+    if not os.path.exists(file_name):
+        return False
+    os.replace(file_name, previous_path(file_name))
+
+    return True
+
+
+# Append the rows of the previous export that were not fetched again in this run.
+# Rows are matched on key_columns (e.g. network and client id), falling back to
+# fallback_columns (e.g. network and mac) when a key column is 'None'.
+def merge_incremental(file_name: str, key_columns: tuple, fallback_columns: tuple, delimiter: str = ';'):
+    previous = previous_path(file_name)
+    if not os.path.exists(previous):
+        return 0
+
+    def row_key(row):
+        columns = key_columns if all(row[i] != 'None' for i in key_columns) else fallback_columns
+        return tuple(row[i] for i in columns)
+
+    with open(file_name, 'r', newline='', encoding='utf-8') as new_file:
+        reader = csv.reader(new_file, delimiter=delimiter)
+        next(reader, None)
+        fetched_keys = {row_key(row) for row in reader}
+
+    kept = 0
+    with open(previous, 'r', newline='', encoding='utf-8') as old_file, \
+         open(file_name, 'a', newline='', encoding='utf-8') as new_file:
+        reader = csv.reader(old_file, delimiter=delimiter)
+        writer = csv.writer(new_file, delimiter=delimiter)
+        next(reader, None)
+        for row in reader:
+            if row_key(row) not in fetched_keys:
+                writer.writerow(row)
+                kept += 1
+    os.remove(previous)
+
+    return kept
@@ -0,0 +1,231 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Run metrics shared by the scripts: per-endpoint call counts and latency histograms,
+# error statuses, retries, time slept and rows written. The rate limiter, the batch
+# scheduler and the export record into the process-wide `metrics` object, and
+# the scripts dump it as JSON and as a Prometheus textfile (for node_exporter's textfile
+# collector) at the end of a run. A live progress line can be printed while a run goes on.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)    # Histogram upper bounds in seconds
+PROGRESS_INTERVAL = 1       # Seconds between progress line updates
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.progress_stop = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.calls = {}             # endpoint -> calls
+            self.latency = {}           # endpoint -> [count per bucket, +Inf last]
+            self.latency_sum = {}       # endpoint -> seconds
+            self.errors = {}            # endpoint -> {status: count}
+            self.retries = {}           # endpoint -> {reason: count}
+            self.sleep = {}             # reason -> seconds, summed over threads
+            self.rows = 0
+            self.write_seconds = 0.0
+            self.first_write = None
+            self.last_write = None
+
+        return None
+
+    # Record one API call. Calls that raised are recorded with their HTTP status.
+    def observe(self, endpoint: str, seconds: float, status: int = None):
+        bucket = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                bucket = i
+                break
+
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            counts = self.latency.setdefault(endpoint, [0] * (len(LATENCY_BUCKETS) + 1))
+            counts[bucket] += 1
+            self.latency_sum[endpoint] = self.latency_sum.get(endpoint, 0.0) + seconds
+            if status is not None:
+                statuses = self.errors.setdefault(endpoint, {})
+                statuses[status] = statuses.get(status, 0) + 1
+
+        return None
+
+    def retried(self, endpoint: str, reason: str):
+        with self.lock:
+            reasons = self.retries.setdefault(endpoint, {})
+            reasons[reason] = reasons.get(reason, 0) + 1
+
+        return None
+
+    def slept(self, reason: str, seconds: float):
+        with self.lock:
+            self.sleep[reason] = self.sleep.get(reason, 0.0) + seconds
+
+        return None
+
+    # time.sleep that is accounted under `reason`.
+    def pause(self, seconds: float, reason: str):
+        time.sleep(seconds)
+        self.slept(reason, seconds)
+
+        return None
+
+    def wrote(self, rows: int, seconds: float = 0.0):
+        now = time.time()
+        with self.lock:
+            self.rows += rows
+            self.write_seconds += seconds
+            if self.first_write is None:
+                self.first_write = now - seconds
+            self.last_write = now
+
+        return None
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            # Rows per second over the time rows were being written, not the whole run with its prompts.
+            writing = max(self.last_write - self.first_write, self.write_seconds) if self.rows else 0.0
+            endpoints = {}
+            for endpoint, calls in sorted(self.calls.items()):
+                endpoints[endpoint] = {
+                    'calls': calls,
+                    'latency_seconds': round(self.latency_sum[endpoint], 3),
+                    'latency_buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'],
+                                                self.latency[endpoint])),
+                    'errors': {str(status): count for status, count in self.errors.get(endpoint, {}).items()},
+                    'retries': dict(self.retries.get(endpoint, {}))
+                    }
+
+            return {
+                'started': self.started,
+                'elapsed_seconds': round(elapsed, 3),
+                'calls': sum(self.calls.values()),
+                'rate_limited': sum(errors.get(429, 0) for errors in self.errors.values()),
+                'bad_requests': sum(errors.get(400, 0) for errors in self.errors.values()),
+                'retries': sum(sum(reasons.values()) for reasons in self.retries.values()),
+                'sleep_seconds': {reason: round(seconds, 3) for reason, seconds in self.sleep.items()},
+                'rows': self.rows,
+                'rows_per_second': round(self.rows / writing, 1) if writing > 0 else 0.0,
+                'write_seconds': round(self.write_seconds, 3),
+                'endpoints': endpoints
+                }
+
+    def prometheus(self, labels: dict = None):
+        snapshot = self.snapshot()
+        base = ','.join(f'{key}="{value}"' for key, value in (labels or {}).items())
+
+        def series(name, value, **extra):
+            parts = [base] if base else []
+            parts += [f'{key}="{label}"' for key, label in extra.items()]
+            return f"{name}{{{','.join(parts)}}} {value}" if parts else f"{name} {value}"
+
+        lines = [
+            "# HELP meraki_api_calls_total Dashboard API calls by endpoint.",
+            "# TYPE meraki_api_calls_total counter"
+            ]
+        for endpoint, stats in snapshot['endpoints'].items():
+            lines.append(series('meraki_api_calls_total', stats['calls'], endpoint=endpoint))
+
+        lines += [
+            "# HELP meraki_api_latency_seconds Dashboard API call latency by endpoint.",
+            "# TYPE meraki_api_latency_seconds histogram"
+            ]
+        for endpoint, stats in snapshot['endpoints'].items():
+            cumulative = 0
+            for bound, count in stats['latency_buckets'].items():
+                cumulative += count
+                lines.append(series('meraki_api_latency_seconds_bucket', cumulative, endpoint=endpoint, le=bound))
+            lines.append(series('meraki_api_latency_seconds_sum', stats['latency_seconds'], endpoint=endpoint))
+            lines.append(series('meraki_api_latency_seconds_count', stats['calls'], endpoint=endpoint))
+
+        lines += [
+            "# HELP meraki_api_errors_total Dashboard API calls that failed, by endpoint and HTTP status.",
+            "# TYPE meraki_api_errors_total counter"
+            ]
+        for endpoint, stats in snapshot['endpoints'].items():
+            for status, count in stats['errors'].items():
+                lines.append(series('meraki_api_errors_total', count, endpoint=endpoint, status=status))
+
+        lines += [
+            "# HELP meraki_api_retries_total Retried Dashboard API calls by endpoint and reason.",
+            "# TYPE meraki_api_retries_total counter"
+            ]
+        for endpoint, stats in snapshot['endpoints'].items():
+            for reason, count in stats['retries'].items():
+                lines.append(series('meraki_api_retries_total', count, endpoint=endpoint, reason=reason))
+
+        lines += [
+            "# HELP meraki_sleep_seconds_total Time spent sleeping by reason, summed over threads and tasks.",
+            "# TYPE meraki_sleep_seconds_total counter"
+            ]
+        for reason, seconds in snapshot['sleep_seconds'].items():
+            lines.append(series('meraki_sleep_seconds_total', seconds, reason=reason))
+
+        lines += [
+            "# HELP meraki_rows_written_total Rows written to the export files.",
+            "# TYPE meraki_rows_written_total counter",
+            series('meraki_rows_written_total', snapshot['rows']),
+            "# HELP meraki_rows_per_second Rows written per second while the export was writing.",
+            "# TYPE meraki_rows_per_second gauge",
+            series('meraki_rows_per_second', snapshot['rows_per_second']),
+            "# HELP meraki_run_duration_seconds Duration of the run.",
+            "# TYPE meraki_run_duration_seconds gauge",
+            series('meraki_run_duration_seconds', snapshot['elapsed_seconds'])
+            ]
+
+        return '\n'.join(lines) + '\n'
+
+    # Write <base_name>.json and <base_name>.prom. Files are replaced atomically so the
+    # textfile collector never reads a half written file.
+    def write(self, base_name: str, labels: dict = None):
+        outputs = [
+            (f"{base_name}.json", json.dumps(self.snapshot(), indent=2)),
+            (f"{base_name}.prom", self.prometheus(labels))
+            ]
+        for path, text in outputs:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as metrics_file:
+                metrics_file.write(text)
+            os.replace(temp_path, path)
+
+        return None
+
+    def progress_line(self):
+        snapshot = self.snapshot()
+        slept = sum(snapshot['sleep_seconds'].values())
+        return (f"{snapshot['elapsed_seconds']:.0f}s  {snapshot['calls']} calls  "
+                f"{snapshot['rate_limited']} x 429  {snapshot['retries']} retries  slept {slept:.1f}s  "
+                f"{snapshot['rows']} rows ({snapshot['rows_per_second']:.0f}/s)")
+
+    # Print the progress line to stderr every `interval` seconds until stop_progress().
+    def start_progress(self, interval: float = PROGRESS_INTERVAL):
+        if self.progress_stop is not None:
+            return None
+        self.progress_stop = threading.Event()
+
+        def report(stop):
+            while not stop.wait(interval):
+                sys.stderr.write(f"\r{self.progress_line()}  ")
+                sys.stderr.flush()
+
+        threading.Thread(target=report, args=(self.progress_stop,), daemon=True).start()
+
+        return None
+
+    def stop_progress(self):
+        if self.progress_stop is None:
+            return None
+        self.progress_stop.set()
+        self.progress_stop = None
+        sys.stderr.write(f"\r{self.progress_line()}  \n")
+
+        return None
+
+
+metrics = Metrics()
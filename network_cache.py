@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+import time
+
+# On-disk cache of organization network lists shared by all scripts.
+# filterNetworks reads the network list from here while it is younger than the TTL,
+# so repeated searches do not call getOrganizationNetworks again.
+#
+# Clear the cache of an organization with:  python network_cache.py clear <org_id>
+
+CACHE_DIR = os.environ.get('MERAKI_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'merakiscripts'))
+NETWORK_CACHE_TTL = 3600    # Seconds a cached network list is used before it is fetched again
+
+
+def cache_path(org_id, name: str = 'networks', extension: str = 'json'):
+    return os.path.join(CACHE_DIR, f"{name}_{org_id}.{extension}")
+
+
+# Seconds since a cache file was written, or None if it does not exist.
+def cache_age(org_id, name: str = 'networks', extension: str = 'json'):
+    try:
+        return time.time() - os.path.getmtime(cache_path(org_id, name, extension))
+    except OSError:
+        return None
+
+
+# Return the cached network list of an organization, or None if it is missing or older than ttl.
+def load_networks(org_id, ttl: float = NETWORK_CACHE_TTL):
+    try:
+        with open(cache_path(org_id), 'r', encoding='utf-8') as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - cached.get('fetched', 0) > ttl:
+        return None
+
+    return cached.get('networks')
+
+
+def save_networks(org_id, networks: list):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(org_id)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump({'fetched': time.time(), 'networks': networks}, cache_file)
+    os.replace(temp_path, path)
+
+    return None
+
+
+# Remove every cached file of an organization.
+def invalidate(org_id):
+    suffix = f"_{org_id}."
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return None
+
+    for name in names:
+        if suffix in name:
+            os.remove(os.path.join(CACHE_DIR, name))
+
+    return None
+
+
+# Return the network list of an organization, fetching it only when the cache is stale.
+def get_org_networks(dashboard, limiter, org_id, ttl: float = NETWORK_CACHE_TTL, refresh: bool = False):
+    networks = None if refresh else load_networks(org_id, ttl)
+    if networks is None:
+        networks = limiter.call(dashboard.organizations.getOrganizationNetworks, org_id)
+        save_networks(org_id, networks)
+
+    return networks
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == 'clear':
+        invalidate(sys.argv[2])
+        print(f"Network cache of organization {sys.argv[2]} cleared.")
+    else:
+        print("Usage: python network_cache.py clear <org_id>")
+        sys.exit(1)
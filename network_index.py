@@ -0,0 +1,218 @@
+import os
+import pickle
+
+from network_cache import NETWORK_CACHE_TTL, cache_age, cache_path, get_org_networks
+
+# Search index over the network names and tags of an organization.
+# Tags are kept in an inverted index and names in a trigram index, so a search only
+# looks at the networks that can match instead of scanning the whole organization.
+# Posting lists are bitmaps (Python ints, bit i = i-th network by name), so and/or/not
+# are single integer operations; rare grams and tags are stored as sets to save memory.
+# The index is persisted next to the cached network list and rebuilt when that changes.
+#
+# Queries are nested tuples:
+#   ('name', 'hel')                name contains 'hel'
+#   ('tag', 'store')               network has the tag 'store'
+#   ('and', q1, q2, ...)           all of the queries match
+#   ('or', q1, q2, ...)            any of the queries matches
+#   ('not', q)                     the query does not match
+
+NGRAM = 3
+SCAN_LIMIT = 256            # Candidate count under which names are checked directly instead of via the index
+
+
+def ngrams(text: str):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def to_bitmap(ids):
+    if isinstance(ids, int):
+        return ids
+    if not ids:
+        return 0
+
+    bits = bytearray(max(ids) // 8 + 1)
+    for network_id in ids:
+        bits[network_id >> 3] |= 1 << (network_id & 7)
+
+    return int.from_bytes(bits, 'little')
+
+
+# Network ids of the set bits, in ascending order.
+def bit_positions(bitmap: int):
+    bits = bin(bitmap)
+    last = len(bits) - 1
+    positions = []
+    position = bits.find('1', 2)
+    while position != -1:
+        positions.append(last - position)
+        position = bits.find('1', position + 1)
+    positions.reverse()
+
+    return positions
+
+
+class NetworkIndex:
+    def __init__(self, networks: list):
+        self.networks = sorted(networks, key=lambda x: x['name'])
+        self.names = [network['name'].lower() for network in self.networks]
+        self.all = (1 << len(self.networks)) - 1
+        self.short_ids = []
+        grams = {}
+        tags = {}
+
+        for network_id, name in enumerate(self.names):
+            if len(name) < NGRAM:
+                self.short_ids.append(network_id)
+            for gram in ngrams(name):
+                grams.setdefault(gram, set()).add(network_id)
+            for tag in self.networks[network_id].get('tags', []):
+                tags.setdefault(tag.lower(), set()).add(network_id)
+
+        # A bitmap costs len(networks) / 8 bytes, a set entry roughly 32 bytes.
+        dense = len(self.networks) // 256
+        self.gram_counts = {gram: len(ids) for gram, ids in grams.items()}
+        self.tag_counts = {tag: len(ids) for tag, ids in tags.items()}
+        self.grams = {gram: to_bitmap(ids) if len(ids) > dense else frozenset(ids) for gram, ids in grams.items()}
+        self.tags = {tag: to_bitmap(ids) if len(ids) > dense else frozenset(ids) for tag, ids in tags.items()}
+
+    # Keep the networks in `within` whose name contains the keyword, checking each name.
+    def scan_names(self, keyword: str, within: int):
+        names = self.names
+        return to_bitmap([network_id for network_id in bit_positions(within) if keyword in names[network_id]])
+
+    # Bitmap of the networks in `within` whose name may contain the keyword, and whether
+    # it is exact. Longer keywords are only checked against the trigrams, so the caller has
+    # to confirm the remaining candidates with scan_names.
+    def name_candidates(self, keyword: str, within: int):
+        if not keyword or not within:
+            return within, True
+        if within.bit_count() <= SCAN_LIMIT:
+            return self.scan_names(keyword, within), True
+
+        if len(keyword) < NGRAM:
+            matches = to_bitmap([network_id for network_id in self.short_ids if keyword in self.names[network_id]])
+            for gram, postings in self.grams.items():
+                if keyword in gram:
+                    matches |= to_bitmap(postings)
+            return matches & within, True
+
+        grams = sorted(ngrams(keyword), key=lambda gram: self.gram_counts.get(gram, 0))
+        rarest = self.grams.get(grams[0], ())
+        if not isinstance(rarest, int):
+            names = self.names
+            return to_bitmap([network_id for network_id in rarest if keyword in names[network_id]]) & within, True
+
+        candidates = within
+        for gram in grams:
+            candidates &= self.grams[gram] if gram in self.grams else 0
+            if not candidates:
+                break
+
+        return candidates, len(keyword) == NGRAM
+
+    # Bitmap of the networks in `within` whose name contains the keyword.
+    def name_matches(self, keyword: str, within: int = None):
+        within = self.all if within is None else within
+        keyword = keyword.lower()
+        candidates, exact = self.name_candidates(keyword, within)
+
+        return candidates if exact else self.scan_names(keyword, candidates)
+
+    def tag_matches(self, tag: str, within: int = None):
+        within = self.all if within is None else within
+        return to_bitmap(self.tags.get(tag.lower(), 0)) & within
+
+    # Rough match count of a query, used to evaluate the most selective parts of an 'and' first.
+    def estimate(self, query: tuple):
+        if query[0] == 'tag':
+            return self.tag_counts.get(query[1].lower(), 0)
+        if query[0] == 'name' and len(query[1]) >= NGRAM:
+            return min(self.gram_counts.get(gram, 0) for gram in ngrams(query[1].lower()))
+
+        return len(self.networks) + 1
+
+    # Bitmap of the networks in `within` that match the query.
+    def evaluate(self, query: tuple, within: int = None):
+        within = self.all if within is None else within
+        operator = query[0]
+        if operator == 'name':
+            return self.name_matches(query[1], within)
+        if operator == 'tag':
+            return self.tag_matches(query[1], within)
+        if operator == 'not':
+            return within & ~self.evaluate(query[1], within)
+        if operator == 'and':
+            # Cheap bitmap filters first, name checks on whatever is left at the end.
+            unconfirmed = []
+            for part in sorted(query[1:], key=self.estimate):
+                if part[0] == 'name':
+                    within, exact = self.name_candidates(part[1].lower(), within)
+                    if not exact:
+                        unconfirmed.append(part[1].lower())
+                else:
+                    within = self.evaluate(part, within)
+                if not within:
+                    return 0
+            for keyword in unconfirmed:
+                within = self.scan_names(keyword, within)
+            return within
+        if operator == 'or':
+            result = 0
+            for part in query[1:]:
+                result |= self.evaluate(part, within & ~result)
+            return result
+
+        raise ValueError(f"Unknown query operator: {operator}")
+
+    # Networks matching the query, sorted by name.
+    def query(self, query: tuple):
+        return [self.networks[network_id] for network_id in bit_positions(self.evaluate(query))]
+
+    # Same semantics as filterNetworks: the name contains every search keyword,
+    # none of the filter keywords, and the network has every tag.
+    def search(self, search_keywords: list, filter_keywords: list, tags_keywords: list):
+        return self.query(search_query(search_keywords, filter_keywords, tags_keywords))
+
+
+def search_query(search_keywords: list, filter_keywords: list, tags_keywords: list):
+    parts = [('name', keyword) for keyword in search_keywords]
+    parts += [('tag', tag) for tag in tags_keywords]
+    if filter_keywords:
+        parts.append(('not', ('or', *[('name', keyword) for keyword in filter_keywords])))
+
+    return ('and', *parts)
+
+
+def load_index(org_id):
+    try:
+        with open(cache_path(org_id, 'index', 'pickle'), 'rb') as index_file:
+            return pickle.load(index_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+
+def save_index(org_id, index: NetworkIndex):
+    path = cache_path(org_id, 'index', 'pickle')
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as index_file:
+        pickle.dump(index, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+    return None
+
+
+# Return the search index of an organization. The persisted index is used while the
+# cached network list is fresh and the index was built from it; otherwise it is rebuilt.
+def get_network_index(dashboard, limiter, org_id, ttl: float = NETWORK_CACHE_TTL):
+    networks_age = cache_age(org_id)
+    index_age = cache_age(org_id, 'index', 'pickle')
+    if networks_age is not None and networks_age <= ttl and index_age is not None and index_age <= networks_age:
+        index = load_index(org_id)
+        if index is not None:
+            return index
+
+    index = NetworkIndex(get_org_networks(dashboard, limiter, org_id, ttl))
+    save_index(org_id, index)
+
+    return index
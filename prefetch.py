@@ -0,0 +1,24 @@
+import threading
+from concurrent.futures import Future
+
+# Starting Dashboard calls ahead of time, e.g. the network list while the user is still
+# answering the prompts. The call runs in a daemon thread, so quitting at a prompt does not
+# wait for it, and its result (or exception) is picked up from the returned Future.
+
+
+def background(function, *args, **kwargs):
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return None
+        try:
+            future.set_result(function(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+        return None
+
+    threading.Thread(target=run, daemon=True).start()
+
+    return future
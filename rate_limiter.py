@@ -0,0 +1,216 @@
+import asyncio
+import random
+import threading
+import time
+
+import meraki
+
+from metrics import metrics
+
+# Shared pacing for Meraki Dashboard API calls.
+# A token bucket sized to the per-organization rate limit that every script
+# routes its calls through, instead of sleeping a fixed time around each call.
+# The same limiter can be shared by threads and asyncio tasks. It is also the one retry
+# policy of the scripts: 429s hold every caller until Retry-After has passed, server errors
+# and dropped connections (which the SDK reports as 503) are retried with exponential
+# backoff and jitter, but only for reads and updates, which are safe to repeat. Paginated
+# listings take a token per page instead (see pages), their failed pages are retried by the SDK.
+
+ORG_RATE_LIMIT = 10         # Dashboard API calls per second per organization
+ORG_BURST = 10              # Extra calls allowed in a short burst
+MIN_RATE = 1                # Lowest rate the limiter slows down to after 429 responses
+MAX_RETRIES = 5             # Retries of a single call that keeps failing with server errors
+MAX_RATE_LIMIT_RETRIES = None   # Retries of a single call after 429s, None = until the Dashboard lets it through
+DEFAULT_RETRY_AFTER = 2     # Seconds to wait on a 429 response without a Retry-After header
+BACKOFF_BASE = 0.5          # Seconds before the first retry of a server error, doubled on each retry
+MAX_BACKOFF = 30            # Longest wait between retries of a server error
+RETRY_STATUSES = (500, 502, 503, 504)
+IDEMPOTENT_PREFIXES = ('get', 'update')     # SDK methods that are GET or PUT requests
+
+
+class RateLimiter:
+    def __init__(self, rate: float = ORG_RATE_LIMIT, burst: int = ORG_BURST,
+                 min_rate: float = MIN_RATE, max_retries: int = MAX_RETRIES,
+                 max_rate_limit_retries: int = MAX_RATE_LIMIT_RETRIES):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    # Take one token and return how many seconds the caller has to wait before using it.
+    # Tokens may go negative, which queues callers in the order they arrived.
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+            return max(wait, self.paused_until - now)
+
+    def pause_remaining(self):
+        with self.lock:
+            return max(0.0, self.paused_until - time.monotonic())
+
+    def acquire(self):
+        wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            metrics.slept('rate_limiter', wait)
+            wait = self.pause_remaining()
+
+        return None
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            metrics.slept('rate_limiter', wait)
+            wait = self.pause_remaining()
+
+        return None
+
+    # Halve the rate and hold every caller until Retry-After has passed. Callers that ran into the
+    # same rate limit window while the limiter was already paused do not halve it again.
+    def penalize(self, retry_after: float):
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.paused_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.tokens = min(self.tokens, 0)
+            self.updated = now
+
+        return None
+
+    # Creep back towards the full rate after each successful call.
+    def reward(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 0.1)
+
+        return None
+
+    # Every attempt is recorded in the run metrics under the SDK method name.
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        limited = 0
+        while True:
+            self.acquire()
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except meraki.APIError as e:
+                metrics.observe(func.__name__, time.perf_counter() - started, e.status)
+                delay = self.retry_delay(func, e, attempt, limited)
+                if delay is None:
+                    raise
+                if delay > 0:
+                    metrics.pause(delay, 'backoff')
+                if e.status == 429:
+                    limited += 1
+                else:
+                    attempt += 1
+                continue
+            metrics.observe(func.__name__, time.perf_counter() - started)
+            self.reward()
+
+            return result
+
+    async def call_async(self, func, *args, **kwargs):
+        attempt = 0
+        limited = 0
+        while True:
+            await self.acquire_async()
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except meraki.APIError as e:
+                metrics.observe(func.__name__, time.perf_counter() - started, e.status)
+                delay = self.retry_delay(func, e, attempt, limited)
+                if delay is None:
+                    raise
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    metrics.slept('backoff', delay)
+                if e.status == 429:
+                    limited += 1
+                else:
+                    attempt += 1
+                continue
+            metrics.observe(func.__name__, time.perf_counter() - started)
+            self.reward()
+
+            return result
+
+    # Yield the items of a listing from an SDK client with use_iterator_for_get_pages, taking a
+    # token before each page of per_page items. The SDK requests the pages itself, so that client
+    # waits out 429s and retries server errors on its own: a failed page is requested again, not
+    # the pages before it. Every page is recorded in the run metrics under operation.
+    def pages(self, items, per_page: int, operation: str):
+        count = 0
+        started = time.perf_counter()
+        while True:
+            page_start = count % per_page == 0
+            if page_start:
+                self.acquire()
+                started = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            except meraki.APIError as e:
+                metrics.observe(operation, time.perf_counter() - started, e.status)
+                raise
+            if page_start:
+                metrics.observe(operation, time.perf_counter() - started)
+            count += 1
+            yield item
+
+        return None
+
+    # Seconds to wait before retrying a failed call, or None if the error is final. 429s and
+    # server errors have their own retry limits (attempt and limited count them so far).
+    # After a 429 the wait happens in acquire(), like for every other caller.
+    def retry_delay(self, func, error: meraki.APIError, attempt: int, limited: int = 0):
+        if error.status == 429:
+            if self.max_rate_limit_retries is not None and limited >= self.max_rate_limit_retries:
+                return None
+            self.on_rate_limited(error)
+            metrics.retried(func.__name__, '429')
+            return 0.0
+        if attempt >= self.max_retries:
+            return None
+        if error.status in RETRY_STATUSES and func.__name__.startswith(IDEMPOTENT_PREFIXES):
+            metrics.retried(func.__name__, str(error.status))
+            return backoff(attempt)
+
+        return None
+
+    def on_rate_limited(self, error: meraki.APIError):
+        retry_after = retry_after_seconds(error)
+        print(f"Rate limit exceeded, retrying in {retry_after} seconds...")
+        self.penalize(retry_after)
+
+        return None
+
+
+# Exponential backoff with full jitter, so workers that failed together do not retry together.
+def backoff(attempt: int):
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt))
+
+
+def retry_after_seconds(error: meraki.APIError):
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', DEFAULT_RETRY_AFTER))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+
+from network_cache import cache_path
+
+# Durable journal of a long run, so an interrupted export or rollout can continue where it
+# stopped instead of starting again from the first network. Every completed network and
+# every submitted action batch is appended as one JSON line and synced to disk before the
+# run moves on. The journal is removed when the run finishes, so only interrupted runs
+# leave one behind.
+#
+# {"header": {...}}                             what the run was started with
+# {"done": "<network id>", "offsets": [...]}    network finished, output file sizes after it
+# {"batch": "<batch id>", "keys": [...]}        action batch submitted for these networks
+#
+# Every job has a journal of its own, named after the organization, the kind of job and a hash
+# of its header, so jobs of the same kind for one organization (e.g. in a batch run) do not
+# start over each other's journal.
+
+
+def journal_path(org_id, kind: str, header: dict):
+    text = json.dumps(header, sort_keys=True, separators=(',', ':'))
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+    return cache_path(org_id, f"journal_{kind}_{key}", 'jsonl')
+
+
+class RunJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.header = None
+        self.done = {}              # key -> the record that completed it
+        self.batches = {}           # batch id -> keys
+        self.offsets = None         # Output file offsets after the last completed network
+        self.valid = 0              # Bytes of the journal up to the last complete record
+        self.file = None
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as journal_file:
+                lines = journal_file.readlines()
+        except OSError:
+            return False
+
+        for line in lines:
+            try:
+                record = json.loads(line) if line.endswith(b'\n') else None
+            except ValueError:
+                record = None
+            if record is None:
+                break               # A line cut short by the interruption
+            self.valid += len(line)
+            if 'header' in record:
+                self.header = record['header']
+            elif 'done' in record:
+                self.done[record['done']] = record
+                self.offsets = record.get('offsets', self.offsets)
+            elif 'batch' in record:
+                self.batches[record['batch']] = record['keys']
+
+        return self.header is not None
+
+    # Continue the journal of an interrupted run if it was started with the same header,
+    # otherwise start a new one. Returns True when resuming.
+    def open(self, header: dict, resume: bool):
+        header = json.loads(json.dumps(header))
+        if resume and self.load() and self.header == header:
+            os.truncate(self.path, self.valid)
+            self.file = open(self.path, 'a', encoding='utf-8')
+            return True
+
+        if resume:
+            print("No interrupted run to resume with these settings, starting from the beginning.")
+        self.header = header
+        self.done = {}
+        self.batches = {}
+        self.offsets = None
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.append({'header': header})
+
+        return False
+
+    def append(self, record: dict):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        return None
+
+    def is_done(self, key: str):
+        return key in self.done
+
+    def mark_done(self, key: str, **details):
+        record = {'done': key, **details}
+        self.done[key] = record
+        self.offsets = record.get('offsets', self.offsets)
+        self.append(record)
+
+        return None
+
+    def mark_batch(self, batch_id: str, keys: list):
+        self.batches[batch_id] = list(keys)
+        self.append({'batch': batch_id, 'keys': list(keys)})
+
+        return None
+
+    # Batches submitted before the interruption whose networks are not all done yet.
+    def open_batches(self):
+        return {batch_id: keys for batch_id, keys in self.batches.items()
+                if not all(key in self.done for key in keys)}
+
+    # Close the journal; a finished run removes it.
+    def close(self, finished: bool = True):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if finished and os.path.exists(self.path):
+            os.remove(self.path)
+
+        return None
@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from device_join import CLIENT_WIDTH, DEVICE_FIELDS, JOINED, SERIAL, DeviceIndex, IndexingWriter, JoiningWriter
+from writer_stage import WriterStage
+
+
+class ListWriter:
+    def __init__(self):
+        self.rows = []
+
+    def writerows(self, rows):
+        self.rows.extend(rows)
+
+
+# Holds the stage thread in its first write until released, so the batches queued meanwhile
+# are all taken by the next drain.
+class Gate:
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def writerows(self, rows):
+        self.entered.set()
+        self.release.wait()
+
+    def hold(self, stage: WriterStage):
+        stage.writer(self).writerows([None])
+        self.entered.wait()
+
+
+def device_row(serial: str):
+    row = ['None'] * len(DEVICE_FIELDS)
+    row[SERIAL] = serial
+    for i in JOINED:
+        row[i] = row[i] if i == SERIAL else f"{serial}-{DEVICE_FIELDS[i]}"
+    return tuple(row)
+
+
+def client_row(client_id: str, serial: str):
+    return tuple([client_id] + ['None'] * (CLIENT_WIDTH - 1) + [serial, 'None', 'Wireless'])
+
+
+class WriterStageOrderTest(unittest.TestCase):
+    # Network B's devices and clients queued while the stage is still writing network A:
+    # B's clients must only be joined after B's devices were indexed.
+    def test_devices_are_indexed_before_their_clients_are_joined(self):
+        gate = Gate()
+        index = DeviceIndex()
+        combined = ListWriter()
+        devices = IndexingWriter(ListWriter(), index)
+        clients = JoiningWriter(ListWriter(), combined, index)
+        stage = WriterStage()
+        devices_writer = stage.writer(devices)
+        clients_writer = stage.writer(clients)
+
+        devices_writer.writerows([device_row('A1')])
+        gate.hold(stage)
+        clients_writer.writerows([client_row('a', 'A1')])
+        devices_writer.writerows([device_row('B1')])
+        clients_writer.writerows([client_row('b', 'B1')])
+        gate.release.set()
+        stage.close()
+
+        joined = {row[0]: row[CLIENT_WIDTH + 3:] for row in combined.rows}
+        self.assertNotIn('None', joined['a'])
+        self.assertNotIn('None', joined['b'])
+
+    def test_rows_are_written_in_queue_order(self):
+        gate = Gate()
+        order = []
+
+        class Recording:
+            def __init__(self, name):
+                self.name = name
+
+            def writerows(self, rows):
+                order.extend((self.name, row) for row in rows)
+
+        stage = WriterStage()
+        first = stage.writer(Recording('first'))
+        second = stage.writer(Recording('second'))
+        gate.hold(stage)
+        first.writerows([1])
+        second.writerows([2])
+        first.writerows([3])
+        second.writerows([4])
+        second.writerows([5])
+        gate.release.set()
+        stage.close()
+
+        self.assertEqual(order, [('first', 1), ('second', 2), ('first', 3), ('second', 4), ('second', 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
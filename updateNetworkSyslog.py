@@ -1,15 +1,56 @@
 import meraki
-import time
+from meraki.config import DEFAULT_BASE_URL
 import sys
+import os
+import json
+from rate_limiter import RateLimiter
+from dashboard_client import get_dashboard
+from action_batches import BatchScheduler
+from network_index import get_network_index
+from network_cache import CACHE_DIR
+from config_snapshots import SnapshotStore, content_hash, print_diff, read_configs
+from metrics import metrics
+from prefetch import background
+from run_journal import RunJournal, journal_path
 
 # This script interacts with the Meraki Dashboard API to:
 # 1. Retrieve and filter networks based on user-defined search criteria.
 # 2. Update syslog server configurations. 
 # 3. Provide feedback on the number of networks updated.
 
-API_KEY = input("Input your API Key from the Meraki Dashboard:")
-org_id = X
-dashboard = meraki.DashboardAPI(API_KEY)
+API_KEY = None
+org_id = None               # Replace with your organization ID
+dashboard = None            # Created by connect()
+limiter = RateLimiter()
+prefetched = None           # Network index loading in the background, started by prefetch()
+journal = None              # Opened by applySyslogServers() for the run
+
+BASE_URL = DEFAULT_BASE_URL # Dashboard API address, e.g. the local simulator in benchmarks/
+NETWORK_CACHE_TTL = 3600    # Seconds the cached network list is reused, 0 = always fetch
+BULK_MODE = True            # Read configs concurrently and apply the changes as action batches
+MAX_WORKERS = 8             # Concurrent syslog config reads in bulk mode
+DRY_RUN = False             # Only print the planned changes as a diff, nothing is updated
+SNAPSHOT_TTL = 86400        # Seconds a network's syslog snapshot is trusted without reading it again, 0 = always read
+METRICS_FILE = 'syslog_metrics' # Run metrics written to <name>.json and <name>.prom, None = off
+PROGRESS = False            # Print a live progress line while the networks are updated
+PREFETCH = True             # Load the network list while the prompts are answered
+RESUME = False              # Skip the networks an interrupted run already updated (or run with --resume)
+ROLE_TABLE_FILE = os.path.join(CACHE_DIR, 'syslog_roles.json')
+
+# Roles the Dashboard only accepts when the network has the given product type.
+ROLE_PRODUCT_TYPES = {
+    'Air Marshal events': 'wireless',
+    'Wireless event log': 'wireless',
+    'Switch event log': 'switch',
+    'Security events': 'appliance'
+    }
+
+def connect(api_key: str):
+    global API_KEY, dashboard
+    API_KEY = api_key
+    dashboard = get_dashboard(api_key, BASE_URL)
+
+    return dashboard
 
 # Prompt the user for search criteria and return the processed keywords.
 def searchNetworks():
@@ -23,136 +64,316 @@ def searchNetworks():
 
     return list(search_keywords), list(filter_keywords), list(tags_keywords)
 
-# Retrieve and filter networks based on the provided keywords.
-def filterNetworks(org_id: int, search_keywords: list, filter_keywords: list, tags_keywords: list):
-    network_results = []
+# Start loading the network index in the background.
+def prefetch():
+    global prefetched
+    if PREFETCH:
+        prefetched = background(get_network_index, dashboard, limiter, org_id, NETWORK_CACHE_TTL)
 
-    retry = True
-    while retry:
-        try:
-            org_networks = dashboard.organizations.getOrganizationNetworks(org_id)
-            retry = False
-        except meraki.APIError as e:
-            if e.status == 429:
-                print("Rate limit exceeded, retrying in 10 seconds...")
-                time.sleep(10)
-            if e.status == 400:
-                print(f"Error: {e}")
-                retry = False 
-            else:
-                print(f"Error: {e}")
-                retry = False
-
-    filter_keywords_set = set(filter_keywords)
-    tags_keywords_set = set(tags_keywords)
+    return None
 
-    for network in org_networks:
-        network_name = network['name'].lower()
-        network_tags = set(tag.lower() for tag in network.get('tags', []))
+# The prefetched network index, or None if there is none.
+def prefetchedIndex():
+    global prefetched
+    future, prefetched = prefetched, None
 
-        name_matches = all(keyword in network_name for keyword in search_keywords)
-        name_excludes = not any(filter_word in network_name for filter_word in filter_keywords_set)
-        tags_match = tags_keywords_set.issubset(network_tags)
+    return future.result() if future is not None else None
 
-        if name_matches and name_excludes and (not tags_keywords or tags_match):
-            network_results.append(network)
-    
-    networks = sorted(network_results, key=lambda x: x['name'])
+# Retrieve and filter networks based on the provided keywords.
+def filterNetworks(org_id: int, search_keywords: list, filter_keywords: list, tags_keywords: list):
+    try:
+        index = prefetchedIndex()
+        if index is None:
+            index = get_network_index(dashboard, limiter, org_id, NETWORK_CACHE_TTL)
+    except meraki.APIError as e:
+        print(f"Error: {e}")
+        return []
 
-    return list(networks)
+    return index.search(search_keywords, filter_keywords, tags_keywords)
 
 
 def printNetworks(networks: list):
     for network in networks:
         print(network['name'])
-        time.sleep(0.001)
+        metrics.pause(0.001, 'display')
+
+    return None
+
+def newSyslogServers():
+    new_syslog_servers = [
+        {'host': '10.245.36.5',
+         'port': 514,
+         'roles':['Air Marshal events',
+                  'Flows',
+                  'URLs', 
+                  'Wireless event log',
+                  'Switch event log', 
+                  'Security events'
+                  ]
+            }
+        ]
+
+    return list(new_syslog_servers)
+
+# Load the roles that were accepted before, keyed by the network's product types.
+def loadRoleTable():
+    try:
+        with open(ROLE_TABLE_FILE, 'r', encoding='utf-8') as table_file:
+            return json.load(table_file)
+    except (OSError, ValueError):
+        return {}
+
+role_table = loadRoleTable()
+
+# The table is shared by every organization, and batch runs for several of them can save it
+# at the same time: roles saved by another run since this one loaded the table are kept, and
+# the file is replaced atomically through a temp file of this process.
+def saveRoleTable():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    table = loadRoleTable()
+    table.update(role_table)
+    temp_path = f"{ROLE_TABLE_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as table_file:
+        json.dump(table, table_file, indent=2)
+    os.replace(temp_path, ROLE_TABLE_FILE)
+
+    return None
+
+def productTypesKey(network: dict):
+    return ','.join(sorted(network.get('productTypes', [])))
+
+# Roles to send for a network: the set accepted before for the same product types,
+# otherwise the roles whose product type the network has.
+def syslogRoles(network: dict):
+    roles = role_table.get(productTypesKey(network))
+    if roles is None:
+        product_types = network.get('productTypes', [])
+        roles = [role for role in newSyslogServers()[0]['roles']
+                 if role not in ROLE_PRODUCT_TYPES or ROLE_PRODUCT_TYPES[role] in product_types]
+
+    return list(roles)
+
+def rememberRoles(network: dict, roles: list):
+    role_table[productTypesKey(network)] = list(roles)
+
+    return None
+
+# Work out the servers a network should have, or None if the target server is already configured.
+def plannedSyslogServers(syslog_servers: list, roles: list = None):
+    new_syslog_servers = newSyslogServers()
+    target_host = new_syslog_servers[0]['host']
+    if roles is not None:
+        new_syslog_servers[0]['roles'] = roles
+
+    for server in syslog_servers or []:
+        if server['host'] == target_host:
+            return None
+        new_syslog_servers.append(server)
+
+    return new_syslog_servers
+
+def getSyslogServers(network: dict):
+    try:
+        return limiter.call(dashboard.networks.getNetworkSyslogServers, network['id'])
+    except meraki.APIError as e:
+        print(f"Error: {e}")
+        print(f"Error in {network['name']}")
+        return None
+
+def readSyslogServers(network: dict):
+    syslog = getSyslogServers(network)
+    if syslog is None:
+        return None
+
+    return list(syslog.get('servers') or [])
+
+# Plan the changes from the snapshots, reading only the networks whose snapshot is stale or failed.
+# Returns (network, current servers, planned servers) for every network that needs the new server.
+def planSyslogChanges(networks: list, store: SnapshotStore):
+    plans = []
+    workers = MAX_WORKERS if BULK_MODE else 1
+    for network, servers in read_configs(store, networks, readSyslogServers, workers):
+        new_syslog_servers = plannedSyslogServers(servers, syslogRoles(network))
+        if new_syslog_servers:
+            plans.append((network, servers, new_syslog_servers))
+        else:
+            networkDone(network)
+
+    return list(plans)
+
+# Record in the journal that the network has the syslog server.
+def networkDone(network: dict):
+    if journal is not None:
+        journal.mark_done(network['id'])
+
+    return None
+
+# Open the run journal of the change to these networks. When resuming, the action batches the
+# interrupted run had sent are followed until they finish and the networks of the completed ones count as done.
+def openJournal(networks: list):
+    header = {'servers': newSyslogServers(), 'networks': content_hash(sorted(network['id'] for network in networks))}
+    run_journal = RunJournal(journal_path(org_id, 'syslog', header))
+    if run_journal.open(header, RESUME):
+        scheduler = BatchScheduler(dashboard, limiter, org_id)
+        for batch_id, network_ids in run_journal.open_batches().items():
+            scheduler.track(batch_id, network_ids)
+        for batch, network_ids in scheduler.finish():
+            if batch and batch['status'].get('completed'):
+                for network_id in network_ids:
+                    run_journal.mark_done(network_id)
+        print(f"Resuming, {len(run_journal.done)} networks were already done.")
+
+    return run_journal
+
+def journalBatch(batch: dict, chunk: list):
+    journal.mark_batch(batch['id'], [network['id'] for network, new_syslog_servers in chunk])
+
+    return None
+
+def printUpdated(updated_networks: list):
+    for u in updated_networks:
+        print(u)
+    print(f"{len(updated_networks)} networks have been updated.")
 
     return None
 
 # Update syslog server configurations
 def updateSyslogServers(networks: list):
     updated_networks = []
-    network_count = 0
+    store = SnapshotStore(org_id, 'syslog', SNAPSHOT_TTL)
 
-    for network in networks:
-        new_syslog_servers = [
-            {'host': '10.245.36.5',
-             'port': 514,
-             'roles':['Air Marshal events',
-                      'Flows',
-                      'URLs', 
-                      'Wireless event log',
-                      'Switch event log', 
-                      'Security events'
-                      ]
-                }
-            ]
-        target_host = new_syslog_servers[0]['host']
-        network_tags = network.get('tags', [])
-
-        retry = True
-        while retry:
-            try:
-                time.sleep(1)
-                syslog = dashboard.networks.getNetworkSyslogServers(network['id'])
-                retry = False
-            except meraki.APIError as e:
-                if e.status == 429:
-                    print("Rate limit exceeded, retrying in 10 seconds...")
-                    time.sleep(10)
-                if e.status == 400:
-                    print(f"Error: {e}")
-                    print(f"Error in {network['name']}")
-                    retry = False 
-                else:
-                    print(f"Error: {e}")
-                    print(f"Error in {network['name']}")
-                    retry = False
+    for network, servers, new_syslog_servers in planSyslogChanges(networks, store):
+        # Roles learned from the networks updated so far in this run.
+        new_syslog_servers[0]['roles'] = syslogRoles(network)
+        if updateRequest(network, new_syslog_servers):
+            store.applied(network['id'], new_syslog_servers)
+            networkDone(network)
+            updated_networks.append(network['name'])
+        else:
+            store.failed(network['id'])
+
+    store.save()
+    saveRoleTable()
+    printUpdated(updated_networks)
         
-        syslog_servers = syslog.get('servers')
-        should_update = False
+    return list(updated_networks)
 
-        if not syslog_servers:
-            should_update = True
-        else:
-            for server in syslog_servers:
-                if server['host'] != target_host:
-                    new_syslog_servers.append(server) 
-                    should_update = True
-                else:
-                    should_update = False
-                    break
-
-        if should_update:
-            result = updateRequest(network, new_syslog_servers)
-            if result:
+# Read the stale configs concurrently, plan the changes locally and apply them as pipelined action batches.
+# When a batch fails none of its actions are applied, so its networks are retried one by one.
+# The roles of a batch are planned when it is sent and the roles of a retry just before it, both
+# from the role table, so a wrong guess for a product type mix is only probed once per run.
+def updateSyslogServersBulk(networks: list):
+    updated_networks = []
+    store = SnapshotStore(org_id, 'syslog', SNAPSHOT_TTL)
+
+    def planRoles(chunk):
+        for network, new_syslog_servers in chunk:
+            new_syslog_servers[0]['roles'] = syslogRoles(network)
+
+        return None
+
+    def batchFinished(batch, chunk):
+        if batch and batch['status'].get('completed'):
+            print(f"Action batch {batch['id']} completed.")
+            for network, new_syslog_servers in chunk:
+                rememberRoles(network, new_syslog_servers[0]['roles'])
+                store.applied(network['id'], new_syslog_servers)
+                networkDone(network)
                 updated_networks.append(network['name'])
-                network_count += 1
-    
-    for u in updated_networks:
-        print(u)
-    print(f"{network_count} networks have been updated.")
-        
-    return None
+            return None
+
+        if batch and not batch['status'].get('failed'):
+            print(f"Action batch {batch['id']} is still pending, check these networks later:")
+            for network, new_syslog_servers in chunk:
+                store.failed(network['id'])
+                print(network['name'])
+            return None
+
+        if batch:
+            print(f"Action batch {batch['id']} failed with errors: {batch['status'].get('errors')}")
+        for network, new_syslog_servers in chunk:
+            print(f"Retrying {network['name']} on its own..")
+            new_syslog_servers[0]['roles'] = syslogRoles(network)
+            if updateRequest(network, new_syslog_servers):
+                store.applied(network['id'], new_syslog_servers)
+                networkDone(network)
+                updated_networks.append(network['name'])
+            else:
+                store.failed(network['id'])
+
+        return None
+
+    scheduler = BatchScheduler(dashboard, limiter, org_id, on_submit=journalBatch if journal else None,
+                               before_submit=planRoles, on_finish=batchFinished)
+    for network, servers, new_syslog_servers in planSyslogChanges(networks, store):
+        action = {
+            "resource": f"/networks/{network['id']}/syslogServers",
+            "operation": "update",
+            "body": {"servers": new_syslog_servers}
+            }
+        scheduler.add(action, (network, new_syslog_servers))
+    scheduler.finish()
+
+    store.save()
+    saveRoleTable()
+    printUpdated(updated_networks)
+
+    return list(updated_networks)
+
+# Print the changes a run would make without updating anything.
+def previewSyslogServers(networks: list):
+    store = SnapshotStore(org_id, 'syslog', SNAPSHOT_TTL)
+    plans = planSyslogChanges(networks, store)
+    for network, servers, new_syslog_servers in plans:
+        print_diff(store, network, servers, new_syslog_servers)
+    store.save()
+    print(f"{len(plans)} networks would be updated.")
+
+    return [network['name'] for network, servers, new_syslog_servers in plans]
+
+# Apply the syslog server to the networks and return the names of the updated ones,
+# or in a dry run the names of the networks that would be updated. Progress is journaled,
+# so with RESUME an interrupted run continues with the networks it had not finished.
+def applySyslogServers(networks: list):
+    global journal
+    if DRY_RUN:
+        return previewSyslogServers(networks)
+
+    journal = openJournal(networks)
+    networks = [network for network in networks if not journal.is_done(network['id'])]
+    finished = False
+    try:
+        if BULK_MODE:
+            updated_networks = updateSyslogServersBulk(networks)
+        else:
+            updated_networks = updateSyslogServers(networks)
+        finished = True
+    finally:
+        journal.close(finished)
+        journal = None
+
+    return list(updated_networks)
 
 # Attempt to update syslog server configurations, adjusting roles on failure.
+# The roles that were accepted are remembered for networks with the same product types.
 def updateRequest(network, new_syslog_servers):
     removed = 0
     while True:
         try:
-            time.sleep(1)
-            response = dashboard.networks.updateNetworkSyslogServers(network['id'], new_syslog_servers)
+            response = limiter.call(dashboard.networks.updateNetworkSyslogServers, network['id'], new_syslog_servers)
+            rememberRoles(network, new_syslog_servers[0]['roles'])
             return True
         except meraki.APIError as e:
-            if e.status == 429:
-                print("Rate limit exceeded, retrying in 10 seconds...")
-                time.sleep(10)
             if e.status == 400:
                 print(f"Error in {network['name']}")
                 if removed > 6:
                     print(f"Error: {e}")
                     return False
+                if removed == 0:
+                    # Probe from the full role set when the precomputed roles were not accepted.
+                    new_syslog_servers[0]['roles'] = newSyslogServers()[0]['roles']
                 removeRoles(removed, new_syslog_servers)
+                metrics.retried('updateNetworkSyslogServers', 'role_fallback')
                 removed += 1
             else:
                 print(f"Error: {e}")
@@ -188,15 +409,31 @@ def removeRoles(removed, new_syslog_servers):
 
     return None
 
+def saveMetrics():
+    if METRICS_FILE:
+        metrics.write(METRICS_FILE, {'script': 'updateNetworkSyslog', 'org': org_id})
+
+    return None
+
 def main():
+    metrics.reset()
+    prefetch()
     Search, Filter, Tags = searchNetworks()
     networks = filterNetworks(org_id, Search, Filter, Tags)
+    if DRY_RUN:
+        print("Dry run, the planned changes are only printed.")
     print("You are updating the following networks..\n")
-    time.sleep(1)
+    metrics.pause(1, 'display')
     printNetworks(networks)
     valinta = input("\nDo you wish to continue (y/n): ")
     if valinta.lower() == "y":
-        updateSyslogServers(networks)
+        if PROGRESS:
+            metrics.start_progress()
+        try:
+            applySyslogServers(networks)
+        finally:
+            metrics.stop_progress()
+        saveMetrics()
     else:
         print("Program is now closing..")
         sys.exit(1)
@@ -204,4 +441,7 @@ def main():
     return None
 
 if __name__ == "__main__":
+    if '--resume' in sys.argv[1:]:
+        RESUME = True
+    connect(input("Input your API Key from the Meraki Dashboard:"))
     main()
@@ -1,15 +1,43 @@
 import meraki # Needs Meraki Python SDK installed
-import time
+from meraki.config import DEFAULT_BASE_URL
 import sys
+from rate_limiter import RateLimiter
+from dashboard_client import get_dashboard
+from action_batches import BatchScheduler
+from network_index import get_network_index
+from config_snapshots import SnapshotStore, content_hash, print_diff, read_configs
+from metrics import metrics
+from prefetch import background
+from run_journal import RunJournal, journal_path
 
 # This script interacts with the Cisco Meraki Dashboard API to search for networks within an organization,
 # filter them by name and tags, and update the configuration of a specified SSID on those networks.
 # Specifically, it enables and configures the SSID to use 802.1X RADIUS authentication with given RADIUS server details,
 # and performs these updates in action batches to handle multiple networks efficiently.
 
-API_KEY = input("Input your API Key from the Meraki Dashboard:")
-org_id = X
-dashboard = meraki.DashboardAPI(API_KEY)
+API_KEY = None
+org_id = None               # Replace with your organization ID
+dashboard = None            # Created by connect()
+limiter = RateLimiter()
+prefetched = None           # Network index loading in the background, started by prefetch()
+journal = None              # Opened by updateSSIDS() for the run
+
+BASE_URL = DEFAULT_BASE_URL # Dashboard API address, e.g. the local simulator in benchmarks/
+NETWORK_CACHE_TTL = 3600    # Seconds the cached network list is reused, 0 = always fetch
+MAX_WORKERS = 8             # Concurrent SSID config reads
+DRY_RUN = False             # Only print the planned changes as a diff, nothing is updated
+SNAPSHOT_TTL = 86400        # Seconds a network's SSID snapshot is trusted without reading it again, 0 = always read
+METRICS_FILE = 'ssid_metrics'   # Run metrics written to <name>.json and <name>.prom, None = off
+PROGRESS = False            # Print a live progress line while the SSIDs are updated
+PREFETCH = True             # Load the network list while the prompts are answered
+RESUME = False              # Skip the networks an interrupted run already updated (or run with --resume)
+
+def connect(api_key: str):
+    global API_KEY, dashboard
+    API_KEY = api_key
+    dashboard = get_dashboard(api_key, BASE_URL)
+
+    return dashboard
 
 def searchNetworks():
     Search = input("Search for networks (Enter = All): ").split(' ')
@@ -26,7 +54,10 @@ def SSID_conf():
     name =  input("Which SSID do you wish to update? (ie. Mtoimisto): ")
     radiusIp = input("Radius server IP: ")
     radiusSecret = input("Radius server secret/password: ")
-    
+
+    return buildSSIDInfo(name, radiusIp, radiusSecret)
+
+def buildSSIDInfo(name: str, radiusIp: str, radiusSecret: str):
     SSID_info = {
         "name": name,
         "enabled": True,
@@ -48,164 +79,233 @@ def SSID_conf():
 
     return dict(SSID_info)
 
-def filterNetworks(org_id: int, search_keywords: list, filter_keywords: list, tags_keywords):
-    network_results = []
+# Start loading the network index in the background.
+def prefetch():
+    global prefetched
+    if PREFETCH:
+        prefetched = background(get_network_index, dashboard, limiter, org_id, NETWORK_CACHE_TTL)
 
-    retry = True
-    while retry:
-        try:
-          org_networks = dashboard.organizations.getOrganizationNetworks(org_id)
-          retry = False
-        except meraki.APIError as e:
-          if e.status == 429:
-              print("Rate limit exceeded, retrying in 10 seconds...")
-              time.sleep(10)
-          if e.status == 400:
-              print(f"Error: {e}")
-              retry = False 
-          else:
-              print(f"Error: {e}")
-              retry = False
-
-    filter_keywords_set = set(filter_keywords)
-    tags_keywords_set = set(tags_keywords)
-
-    for network in org_networks:
-        network_name = network['name'].lower()
-        network_tags = set(tag.lower() for tag in network.get('tags', []))
-
-        name_matches = all(keyword in network_name for keyword in search_keywords)
-        name_excludes = not any(filter_word in network_name for filter_word in filter_keywords_set)
-        tags_match = tags_keywords_set.issubset(network_tags)
-
-        if name_matches and name_excludes and (not tags_keywords or tags_match):
-            network_results.append(network)
-    
-    networks = sorted(network_results, key=lambda x: x['name'])
+    return None
 
-    return list(networks)
+# The prefetched network index, or None if there is none.
+def prefetchedIndex():
+    global prefetched
+    future, prefetched = prefetched, None
 
-def print_networks(NETWORKS: dict):
-    for id in NETWORKS:
-        print (NETWORKS[id])
-        time.sleep(0.001)
+    return future.result() if future is not None else None
+
+def filterNetworks(org_id: int, search_keywords: list, filter_keywords: list, tags_keywords):
+    try:
+        index = prefetchedIndex()
+        if index is None:
+            index = get_network_index(dashboard, limiter, org_id, NETWORK_CACHE_TTL)
+    except meraki.APIError as e:
+        print(f"Error: {e}")
+        return []
+
+    return index.search(search_keywords, filter_keywords, tags_keywords)
+
+def print_networks(NETWORKS: list):
+    for network in NETWORKS:
+        print (network['name'])
+        metrics.pause(0.001, 'display')
 
     return None
 
-def updateSSIDS(NETWORKS: dict, SSID_info: dict):
-    action_batches_ssid = []
-    counter = 0
-    networkList = []
+def getApplianceSsids(network: dict):
+    try:
+        return network, limiter.call(dashboard.appliance.getNetworkApplianceSsids, network['id'])
+    except meraki.APIError as e:
+        print(f"Error: {e}")
+        print(f"Error in {network['name']}")
+        return network, None
+
+# The fields of the SSIDs the update looks at, kept in the snapshots (no secrets).
+def ssidSnapshot(get_ssids: list):
+    snapshot = []
+    for ssid in get_ssids:
+        radius = [{'host': i.get('host'), 'port': i.get('port')} for i in ssid.get('radiusServers', [])]
+        snapshot.append({'number': ssid['number'], 'name': ssid['name'], 'enabled': ssid.get('enabled'),
+                         'radiusServers': radius})
+
+    return list(snapshot)
+
+def readApplianceSsids(network: dict):
+    network, get_ssids = getApplianceSsids(network)
+    if get_ssids is None:
+        return None
+
+    return ssidSnapshot(get_ssids)
+
+# The enabled SSIDs of a network that match by name and still point to another RADIUS server.
+def ssidsToUpdate(get_ssids: list, SSID_info: dict):
+    ssids = []
     new_radiusIp = SSID_info["radiusServers"][0]["host"]
+    for ssid in get_ssids or []:
+        enabled = ssid.get('enabled')
+        if SSID_info['name'].lower() == ssid['name'].lower() and enabled:
+            ssid_radius = ssid.get('radiusServers', [])
+            if any(i.get('host') != new_radiusIp for i in ssid_radius):
+                ssids.append(ssid)
+
+    return list(ssids)
+
+def ssidActions(network: dict, get_ssids: list, SSID_info: dict):
+    actions = []
+    for ssid in ssidsToUpdate(get_ssids, SSID_info):
+        ssid_number = ssid['number']
+        action = {
+            "resource": f"/networks/{network['id']}/appliance/ssids/{ssid_number}",
+            "operation": "update",
+            "body": SSID_info
+            }
+        actions.append(action)
+
+    return list(actions)
+
+# The SSID snapshot of a network after the update.
+def plannedSsids(ssids: list, SSID_info: dict):
+    numbers = {ssid['number'] for ssid in ssidsToUpdate(ssids, SSID_info)}
+    radius = [{'host': i['host'], 'port': i.get('port')} for i in SSID_info['radiusServers']]
+    planned = []
+    for ssid in ssids:
+        if ssid['number'] in numbers:
+            ssid = dict(ssid, enabled=True, radiusServers=radius)
+        planned.append(ssid)
+
+    return list(planned)
+
+# Open the run journal of an SSID change to these networks; the secret only enters it as part
+# of a hash. When resuming, the action batches the interrupted run had sent are followed until
+# they finish and the networks whose batches all completed count as done.
+def openJournal(SSID_info: dict, NETWORKS: list):
+    header = {'ssid': content_hash(SSID_info), 'networks': content_hash(sorted(network['id'] for network in NETWORKS))}
+    run_journal = RunJournal(journal_path(org_id, 'ssid', header))
+    if run_journal.open(header, RESUME):
+        scheduler = BatchScheduler(dashboard, limiter, org_id)
+        for batch_id, networkList in run_journal.open_batches().items():
+            scheduler.track(batch_id, networkList)
+        results = scheduler.finish()
+        not_applied = {x for batch, networkList in results if batch is None or not batch['status'].get('completed')
+                       for x in networkList}
+        for batch, networkList in results:
+            for x in networkList:
+                if x not in not_applied and not run_journal.is_done(x):
+                    run_journal.mark_done(x)
+        print(f"Resuming, {len(run_journal.done)} networks were already done.")
+
+    return run_journal
 
-    for network_id, network_name in NETWORKS.items():
-        get_ssids = None
-        retry = True
-        while retry:
-            try:
-                get_ssids = dashboard.appliance.getNetworkApplianceSsids(network_id)
-                time.sleep(0.4)
-                retry = False
-            except meraki.APIError as e:
-                if e.status == 429:
-                    print("Rate limit exceeded, retrying in 10 seconds...")
-                    time.sleep(10)
-                if e.status == 400:
-                    print(f"Error: {e}")
-                    retry = False 
-                else:
-                    print(f"Error: {e}")
-                    retry = False
-
-        ssid_number = None
-        if get_ssids:
-            for ssid in get_ssids:
-                enabled = ssid.get('enabled')
-                if SSID_info['name'].lower() == ssid['name'].lower() and enabled:
-                    ssid_radius = ssid.get('radiusServers', [])
-                    if ssid_radius:
-                        for i in ssid_radius:
-                            host = i.get('host')
-                            if host != new_radiusIp:
-                                ssid_number = ssid['number']
-                                action = {
-                                    "resource": f"/networks/{network_id}/appliance/ssids/{ssid_number}",
-                                    "operation": "update",
-                                    "body": SSID_info
-                                    }
-                                action_batches_ssid.append(action)
-                                networkList.append(network_name)
-
-        counter += 1  
-        if len(action_batches_ssid) == 100 or counter == len(NETWORKS):
-            try:   
-                batch = dashboard.organizations.createOrganizationActionBatch(
-                    org_id,
-                    action_batches_ssid, 
-                    confirmed=True, 
-                    synchronous=False
-                    )
-                action_batches_ssid.clear()
-                print("Action batch sent..")
-                for x in networkList:
-                    print(x)
-            except meraki.APIError as e:
-                print(f"Failed to send action batch: {e}")
-                print(f"The program will now close.")
-                sys.exit(1)
-            
-            while check_batch_status(org_id, batch['id']):
-                time.sleep(10)
-
-            break
+def journalBatch(batch: dict, networkList: list):
+    journal.mark_batch(batch['id'], networkList)
 
     return None
 
-def check_batch_status(org_id: int, batch_id: str):
-    max_retries=30
-    retries = 0
-    while retries < max_retries:  
-        try:
-            status = dashboard.organizations.getOrganizationActionBatch(org_id, batch_id)
-            print(f"Batch ID {batch_id} status: {status['status']}")
-
-            if status['status'].get('completed', False):
-                print(f"Batch {batch_id} completed successfully.")
-                time.sleep(10)
-                return False
-            elif status['status'].get('failed', False):
-                print(f"Batch {batch_id} failed with errors: {status['errors']}")
-                time.sleep(10) 
-                return True
+# A pool of readers fetches the SSID configs of the networks without a fresh snapshot while
+# this thread turns each one into actions as soon as it arrives and hands them to the batch
+# scheduler, which keeps several action batches running while the next one is being filled.
+# Progress is journaled, so with RESUME an interrupted run continues where it stopped.
+def updateSSIDS(NETWORKS: list, SSID_info: dict):
+    global journal
+    journal = openJournal(SSID_info, NETWORKS)
+    NETWORKS = [network for network in NETWORKS if not journal.is_done(network['id'])]
+    store = SnapshotStore(org_id, 'ssid', SNAPSHOT_TTL)
+    scheduler = BatchScheduler(dashboard, limiter, org_id, on_submit=journalBatch)
+    plans = {}
+    finished = False
+
+    try:
+        for network, ssids in read_configs(store, NETWORKS, readApplianceSsids, MAX_WORKERS):
+            actions = ssidActions(network, ssids, SSID_info)
+            if actions:
+                plans[network['id']] = (network, plannedSsids(ssids, SSID_info))
             else:
-                print(f"Batch {batch_id} is still in progress or pending. Checking again in 10 seconds.")
-                time.sleep(10)
-                retries += 1
-        except meraki.APIError as e:
-            print(f"Failed to retrieve status for batch {batch_id}: {e}")
-            break
-        
-    print(f"Exceeded max retries for batch {batch_id}. The program will now close.")
-    sys.exit(1)
-
-    return True
+                journal.mark_done(network['id'])
+            for action in actions:
+                scheduler.add(action, network['id'])
+
+        results = scheduler.finish()
+        finished = True
+    finally:
+        journal.close(finished)
+        journal = None
+    names = {network_id: network['name'] for network_id, (network, planned) in plans.items()}
+    results = [(batch, [names[x] for x in networkList]) for batch, networkList in results]
+    print_batch_results(results)
+
+    # A network is only up to date if every batch with one of its SSIDs completed.
+    not_applied = {x for batch, networkList in results if batch is None or not batch['status'].get('completed')
+                   for x in networkList}
+    for network, planned in plans.values():
+        if network['name'] in not_applied:
+            store.failed(network['id'])
+        else:
+            store.applied(network['id'], planned)
+    store.save()
+
+    return list(results)
+
+# Print the changes a run would make without updating anything.
+def previewSSIDS(NETWORKS: list, SSID_info: dict):
+    store = SnapshotStore(org_id, 'ssid', SNAPSHOT_TTL)
+    changed = []
+
+    for network, ssids in read_configs(store, NETWORKS, readApplianceSsids, MAX_WORKERS):
+        if ssidsToUpdate(ssids, SSID_info):
+            print_diff(store, network, ssids, plannedSsids(ssids, SSID_info))
+            changed.append(network['name'])
+    store.save()
+    print(f"{len(changed)} networks would be updated.")
+
+    return list(changed)
+
+def print_batch_results(results: list):
+    for batch, networkList in results:
+        if batch is None:
+            print("These networks were not updated, the action batch could not be sent:")
+        elif batch['status'].get('completed', False):
+            print(f"Batch {batch['id']} completed successfully.")
+        elif batch['status'].get('failed', False):
+            print(f"Batch {batch['id']} failed with errors: {batch['status'].get('errors')}")
+        else:
+            print(f"Batch {batch['id']} is still in progress or pending, check these networks later:")
+        for x in networkList:
+            print(x)
+
+    return None
+
+def saveMetrics():
+    if METRICS_FILE:
+        metrics.write(METRICS_FILE, {'script': 'update_appliance_ssid_RADIUS', 'org': org_id})
+
+    return None
 
 def main():
+    metrics.reset()
+    prefetch()
     Search, Filter, Tags = searchNetworks()
     SSID_info = SSID_conf()
     networks = filterNetworks(org_id, Search, Filter, Tags)
     print("You are configuring the following networks..\n")
-    time.sleep(1)
+    metrics.pause(1, 'display')
     print_networks(networks)
-    time.sleep(1)
+    metrics.pause(1, 'display')
     print("\nYou have given the following configurations..\n")
-    time.sleep(1)
+    metrics.pause(1, 'display')
     for maaritys in SSID_info:
         print(f"{maaritys}: {SSID_info[maaritys]}")
-        time.sleep(0.025)
+        metrics.pause(0.025, 'display')
     Valinta = input("\nWill you accept these changes? (Y/N)").lower()
-    if Valinta == 'y':
-        updateSSIDS(networks, SSID_info)
+    if Valinta == 'y' and DRY_RUN:
+        previewSSIDS(networks, SSID_info)
+    elif Valinta == 'y':
+        if PROGRESS:
+            metrics.start_progress()
+        try:
+            updateSSIDS(networks, SSID_info)
+        finally:
+            metrics.stop_progress()
+        saveMetrics()
         print("All configurations are done.\n")
     elif Valinta == 'n':
         print("The program will close now.")
@@ -213,5 +313,8 @@ def main():
     return None
 
 if __name__ == "__main__":
+    if '--resume' in sys.argv[1:]:
+        RESUME = True
+    connect(input("Input your API Key from the Meraki Dashboard:"))
     main()
 
@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+# Background writer stage of the export. Rows handed to a stage writer are put on a bounded
+# queue and written by one thread, so fetching goes on while earlier networks are being
+# compressed and written to disk. The fetching side only waits when the queue is full, which
+# keeps the rows in memory bounded when the disk is slower than the API; that wait is recorded
+# as 'write_queue' sleep.
+#
+# The thread takes whatever is queued (up to batch_rows rows) and writes it in the order it was
+# queued, joining only consecutive batches for the same file into one writerows call, so the
+# devices of a network are always written before its clients. Callbacks queued with after()
+# run on the thread once everything queued before them is written, e.g. to journal a network
+# with the file offsets after it. An error in the thread is raised on the next write or close.
+
+QUEUE_BATCHES = 64          # Row batches queued before fetching waits for the disk
+BATCH_ROWS = 10000          # Most rows put on the queue or written in one writerows call
+
+STOP = object()
+
+
+class WriterStage:
+    def __init__(self, queue_batches: int = QUEUE_BATCHES, batch_rows: int = BATCH_ROWS):
+        self.queue = queue.Queue(maxsize=queue_batches)
+        self.batch_rows = batch_rows
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='writer-stage', daemon=True)
+        self.thread.start()
+
+    # Writer that queues its rows for `writer` (any export writer) on this stage.
+    def writer(self, writer):
+        return StageWriter(self, writer)
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            started = time.perf_counter()
+            self.queue.put(item)
+            metrics.slept('write_queue', time.perf_counter() - started)
+
+        return None
+
+    def after(self, callback):
+        self.put((None, callback))
+
+        return None
+
+    def run(self):
+        stopped = False
+        while not stopped:
+            pending = []            # [writer, rows] in queue order, consecutive batches of a writer joined
+            rows = 0
+            callback = None
+            item = self.queue.get()
+            while True:
+                if item is STOP:
+                    stopped = True
+                    break
+                writer, data = item
+                if writer is None:
+                    callback = data
+                    break
+                if pending and pending[-1][0] is writer:
+                    pending[-1][1].extend(data)
+                else:
+                    pending.append([writer, list(data)])
+                rows += len(data)
+                if rows >= self.batch_rows:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if self.error is not None:
+                continue            # Keep draining so the fetching side never blocks on a dead thread
+            try:
+                for writer, data in pending:
+                    started = time.perf_counter()
+                    writer.writerows(data)
+                    metrics.wrote(len(data), time.perf_counter() - started)
+                if callback is not None:
+                    callback()
+            except BaseException as e:
+                self.error = e
+
+        return None
+
+    # Write everything still queued and stop the thread.
+    def stop(self):
+        if self.thread.is_alive():
+            self.queue.put(STOP)
+            self.thread.join()
+
+        return None
+
+    # Stop the thread and raise the error it stopped writing on, if any.
+    def close(self):
+        self.stop()
+        if self.error is not None:
+            raise self.error
+
+        return None
+
+
+class StageWriter:
+    def __init__(self, stage: WriterStage, writer):
+        self.stage = stage
+        self.writer = writer
+
+    # Rows may be a generator (e.g. streamed client pages); it is read here, batch_rows at a time.
+    def writerows(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.stage.batch_rows:
+                self.stage.put((self.writer, batch))
+                batch = []
+        if batch:
+            self.stage.put((self.writer, batch))
+
+        return None
+
+    # offset() and truncate() only belong on the stage thread, i.e. in an after() callback.
+    def offset(self):
+        return self.writer.offset()
+
+    def truncate(self, offset: int):
+        self.writer.truncate(offset)
+
+        return None
+
+    # Close the file once the stage is stopped.
+    def close(self):
+        self.writer.close()
+
+        return None